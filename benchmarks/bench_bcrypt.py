@@ -0,0 +1,117 @@
+"""Measure bcrypt throughput and /login latency at several hasher pool sizes.
+
+Usage (from the repo root):
+    python benchmarks/bench_bcrypt.py --rounds 12 --pool-sizes 1,2,4 --concurrency 16
+
+Runs against a throwaway SQLite database and images directory, so it never
+touches the real site.db. Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_hashes(server, count, concurrency):
+    hasher = server.password_hasher
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        list(callers.map(lambda i: hasher.hash(f"bench-password-{i}"), range(count)))
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def bench_logins(server, email, password, count, concurrency):
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one_login(_):
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        start = time.perf_counter()
+        res = local.client.post("/login", json={"email": email, "password": password})
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        list(callers.map(one_login, range(count)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": count,
+        "logins_per_sec": round(count / wall, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_LOG_ROUNDS to benchmark")
+    parser.add_argument("--pool-sizes", default="1,2,4", help="comma-separated hasher pool sizes")
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous callers")
+    parser.add_argument("--hashes", type=int, default=32, help="raw hashes per pool size")
+    parser.add_argument("--logins", type=int, default=64, help="login requests per pool size")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-bcrypt-")
+    os.makedirs(os.path.join(workdir, "Images"))
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+    os.environ["IMAGES_PATH"] = os.path.join(workdir, "Images")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["BCRYPT_LOG_ROUNDS"] = str(args.rounds)
+    # Keep the pending cap out of the way so the benchmark measures queueing, not rejections
+    os.environ["BCRYPT_MAX_PENDING"] = str(max(args.concurrency * 2, 64))
+    os.environ["CATALOG_RECONCILE_SECONDS"] = "0"
+    # Every simulated login comes from one address; measure hashing, not the auth rate limit
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import server
+
+    email, password = "bench@example.com", "Bench@1234"
+    with server.app.app_context():
+        server.migrate_database()
+        hashed_password, hashed_answer = server.password_hasher.hash(password, "bench")
+        server.db.session.add(server.User(
+            email=email,
+            password=hashed_password,
+            security_question="Bench?",
+            security_answer=hashed_answer,
+        ))
+        server.db.session.commit()
+    server.create_app(start_jobs=False)
+
+    results = {"rounds": args.rounds, "concurrency": args.concurrency, "cpus": os.cpu_count(), "runs": []}
+    for size in [int(s) for s in args.pool_sizes.split(",") if s.strip()]:
+        server.password_hasher.resize(size)
+        run = {"pool_size": size}
+        run["hashes_per_sec"] = round(bench_hashes(server, args.hashes, args.concurrency), 2)
+        run["login"] = bench_logins(server, email, password, args.logins, args.concurrency)
+        results["runs"].append(run)
+        print(f"pool={size}: {run['hashes_per_sec']} hashes/s, login p99 {run['login']['p99_ms']} ms", file=sys.stderr)
+
+    server.activity_log_writer.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
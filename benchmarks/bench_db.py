@@ -0,0 +1,137 @@
+"""Measure SQLite write throughput under concurrent writers and readers, before and after tuning.
+
+Usage (from the repo root):
+    python benchmarks/bench_db.py --writers 8 --readers 4 --writes 200
+
+Each configuration runs in a fresh interpreter against a throwaway SQLite database,
+so it never touches the real site.db. "baseline" is the old setup (rollback journal,
+synchronous=FULL, reads on the write pool); "tuned" is the server's defaults (WAL,
+synchronous=NORMAL, separate read pool). Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CONFIGS = {
+    "baseline": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_READ_POOL_SIZE": "0"},
+    "tuned": {},
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_config(args):
+    """Runs inside the child interpreter with the configuration already in the environment."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import server
+    from server import db
+
+    with server.app.app_context():
+        server.migrate_database()
+        user = server.User(email="bench@example.com", password="x", security_question="q", security_answer="a")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    latencies = []
+    errors = {"locked": 0, "other": 0}
+    reads = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def one_write(i):
+        # The two hot writers from the request path: an activity log row and a lockout counter
+        with server.app.app_context():
+            start = time.perf_counter()
+            try:
+                db.session.add(server.ActivityLog(user_id=user_id, user_email="bench@example.com", action="bench", details=str(i)))
+                db.session.commit()
+                server.User.query.filter_by(id=user_id).update({server.User.failed_login_attempts: i % 5})
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+                return
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    def reader():
+        with server.app.app_context():
+            while not stop.is_set():
+                db.session.query(server.ActivityLog).order_by(server.ActivityLog.id.desc()).limit(50).all()
+                db.session.query(server.ClubMember).all()
+                db.session.commit()
+                with lock:
+                    reads[0] += 1
+
+    reader_threads = [threading.Thread(target=reader, daemon=True) for _ in range(args.readers)]
+    for t in reader_threads:
+        t.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.writers) as writers:
+        list(writers.map(one_write, range(args.writes)))
+    wall = time.perf_counter() - start
+    stop.set()
+    for t in reader_threads:
+        t.join()
+
+    return {
+        "transactions": len(latencies) * 2,
+        "writes_per_sec": round(len(latencies) * 2 / wall, 2),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "reads_per_sec": round(reads[0] / wall, 2),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer threads")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent reader threads")
+    parser.add_argument("--writes", type=int, default=200, help="write operations (two transactions each) per configuration")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="comma-separated configurations to run")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(args)))
+        return
+
+    results = {"writers": args.writers, "readers": args.readers, "cpus": os.cpu_count(), "runs": []}
+    for name in [c.strip() for c in args.configs.split(",") if c.strip()]:
+        workdir = tempfile.mkdtemp(prefix="bench-db-")
+        os.makedirs(os.path.join(workdir, "Images"))
+        env = dict(os.environ, **CONFIGS[name])
+        env.setdefault("JWT_SECRET_KEY", "bench-secret")
+        env["IMAGES_PATH"] = os.path.join(workdir, "Images")
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name, "--writers", str(args.writers),
+             "--readers", str(args.readers), "--writes", str(args.writes)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        run = {"config": name, **json.loads(out.strip().splitlines()[-1])}
+        results["runs"].append(run)
+        print(f"{name}: {run['writes_per_sec']} writes/s, p99 {run['p99_ms']} ms, {run['reads_per_sec']} reads/s", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+"""Benchmark listing, serving, upload and zip paths against a synthetic media tree.
+
+Usage (from the repo root):
+    python benchmarks/bench_media.py                          # small tree, every scenario
+    python benchmarks/bench_media.py --preset large --tree /data/bench --output large.json
+    python benchmarks/bench_media.py --tree /data/bench --url http://localhost:8087 \\
+        --email admin@example.com --password ...              # drive a running server
+
+The tree lives under --tree (a temp dir by default) as Images/ plus bench.db and is
+reused when its parameters match, because building a million files takes a while.
+Small files are hardlinks of one JPEG unless --copy-files is given, so runs measure
+the server rather than the disk; videos are sparse files. In-process runs drive the
+Flask test client and run each scenario in a fresh interpreter so peak RSS is per
+scenario. With --url the server must use <tree>/Images as IMAGES_PATH, and peak RSS
+is not reported. Results are printed (and optionally written) as JSON.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+PRESETS = {
+    "small": {"folders": 200, "files_per_folder": 50, "videos": 2, "video_mb": 256, "upload_mb": 128},
+    "large": {"folders": 10000, "files_per_folder": 100, "videos": 3, "video_mb": 2048, "upload_mb": 2048},
+}
+SCENARIOS = ["catalog", "listing", "listing_recursive", "image_get", "range_get", "upload_sessions", "upload_chunk", "zip_download"]
+FOLDERS_PER_EVENT = 100
+MB = 1024 * 1024
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(max(own, children) * scale / MB, 1)
+
+
+# Synthetic tree
+
+def leaf_folder(i):
+    return f"Gallery/Event{i // FOLDERS_PER_EVENT:04d}/Folder{i:05d}"
+
+
+def sample_jpeg():
+    try:
+        from PIL import Image
+    except ImportError:
+        return os.urandom(20000)
+    buf = io.BytesIO()
+    Image.effect_noise((640, 480), 40).convert("RGB").save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def build_tree(tree, params, copy_files):
+    images = os.path.join(tree, "Images")
+    marker = os.path.join(tree, "tree.json")
+    wanted = dict(params, copy_files=copy_files)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == wanted:
+                return False
+        raise SystemExit(f"{tree} holds a tree built with other parameters; pick another --tree")
+
+    start = time.perf_counter()
+    jpeg = sample_jpeg()
+    source = os.path.join(tree, "source.jpg")
+    os.makedirs(images, exist_ok=True)
+    with open(source, "wb") as f:
+        f.write(jpeg)
+    for i in range(params["folders"]):
+        folder = os.path.join(images, leaf_folder(i))
+        os.makedirs(folder, exist_ok=True)
+        for j in range(params["files_per_folder"]):
+            path = os.path.join(folder, f"img{j:04d}.jpg")
+            if copy_files:
+                with open(path, "wb") as f:
+                    f.write(jpeg)
+            else:
+                os.link(source, path)
+        if i and i % 1000 == 0:
+            print(f"built {i} folders", file=sys.stderr)
+    videos = os.path.join(images, "Gallery", "Videos")
+    os.makedirs(videos, exist_ok=True)
+    for i in range(params["videos"]):
+        with open(os.path.join(videos, f"video{i}.mp4"), "wb") as f:
+            f.truncate(params["video_mb"] * MB)  # sparse
+    os.makedirs(os.path.join(images, "Gallery", "Uploads"), exist_ok=True)
+    with open(marker, "w") as f:
+        json.dump(wanted, f)
+    print(f"built tree in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return True
+
+
+# Drivers
+
+class TestClientDriver:
+    def __init__(self, server):
+        self.server = server
+        self._local = threading.local()
+        self.headers = {}
+
+    def request(self, method, path, headers=None, data=None, json_body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.server.app.test_client()
+        res = client.open(path, method=method, headers={**self.headers, **(headers or {})}, data=data, json=json_body)
+        size = 0
+        for chunk in res.response:
+            size += len(chunk)
+        res.close()
+        return res.status_code, size, res
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {}
+
+    def request(self, method, path, headers=None, data=None, json_body=None):
+        headers = {**self.headers, **(headers or {})}
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        if isinstance(data, dict):
+            raise ValueError("multipart bodies are only supported in-process")
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            res = urllib.request.urlopen(req)
+        except urllib.error.HTTPError as e:
+            res = e
+        size = 0
+        while True:
+            chunk = res.read(MB)
+            if not chunk:
+                break
+            size += len(chunk)
+        body = None
+        if size and res.headers.get("Content-Type", "").startswith("application/json"):
+            body = size
+        res.close()
+        return res.status, size, body
+
+
+def login(driver, email, password):
+    if isinstance(driver, TestClientDriver):
+        res = driver.server.app.test_client().post("/login", json={"email": email, "password": password})
+        token = (res.get_json() or {}).get("token")
+    else:
+        req = urllib.request.Request(driver.base_url + "/login", data=json.dumps({"email": email, "password": password}).encode(),
+                                     method="POST", headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as res:
+            token = json.load(res).get("token")
+    if not token:
+        raise SystemExit("login failed; check --email/--password")
+    driver.headers["Authorization"] = f"Bearer {token}"
+
+
+def json_request(driver, method, path, body):
+    # Small JSON calls (upload session setup); returns (status, parsed body)
+    if isinstance(driver, TestClientDriver):
+        res = driver.server.app.test_client().open(path, method=method, headers=driver.headers, json=body)
+        return res.status_code, res.get_json()
+    req = urllib.request.Request(driver.base_url + path, data=json.dumps(body).encode(), method=method,
+                                 headers={**driver.headers, "Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as res:
+            return res.status, json.load(res)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+# Scenarios
+
+def timed_ops(ops, concurrency):
+    """Runs callables returning (status, bytes) on a thread pool; returns the result dict."""
+    latencies = []
+    errors = 0
+    total_bytes = 0
+    lock = threading.Lock()
+
+    def run(op):
+        nonlocal errors, total_bytes
+        start = time.perf_counter()
+        status, size = op()
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            total_bytes += size
+            if status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, ops))
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "req_per_sec": round(len(latencies) / wall, 2) if wall else None,
+        "mb_per_sec": round(total_bytes / MB / wall, 2) if wall else None,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+    }
+
+
+def get_op(driver, path, headers=None):
+    def op():
+        status, size, _ = driver.request("GET", path, headers=headers)
+        return status, size
+    return op
+
+
+def scenario_listing(driver, params, args, rng):
+    folders = [leaf_folder(rng.randrange(params["folders"])) for _ in range(args.requests)]
+    return timed_ops([get_op(driver, f"/api/images/{folder}") for folder in folders], args.concurrency)
+
+
+def scenario_listing_recursive(driver, params, args, rng):
+    events = max(1, -(-params["folders"] // FOLDERS_PER_EVENT))
+    paths = [f"/api/images/Gallery/Event{rng.randrange(events):04d}?limit=100" for _ in range(args.requests)]
+    return timed_ops([get_op(driver, path) for path in paths], args.concurrency)
+
+
+def scenario_image_get(driver, params, args, rng):
+    paths = [
+        f"/api/image/{leaf_folder(rng.randrange(params['folders']))}/img{rng.randrange(params['files_per_folder']):04d}.jpg"
+        for _ in range(args.requests)
+    ]
+    return timed_ops([get_op(driver, path) for path in paths], args.concurrency)
+
+
+def scenario_range_get(driver, params, args, rng):
+    if not params["videos"]:
+        return {"skipped": "no videos in tree"}
+    size = params["video_mb"] * MB
+    span = args.range_kb * 1024
+    ops = []
+    for _ in range(args.requests):
+        offset = rng.randrange(max(1, size - span))
+        path = f"/api/image/Gallery/Videos/video{rng.randrange(params['videos'])}.mp4"
+        ops.append(get_op(driver, path, {"Range": f"bytes={offset}-{offset + span - 1}"}))
+    return timed_ops(ops, args.concurrency)
+
+
+def upload_payload(chunk_bytes):
+    # One random chunk reused for every index: cheap to produce, incompressible on the wire
+    return os.urandom(chunk_bytes)
+
+
+def scenario_upload_sessions(driver, params, args, rng):
+    file_size = params["upload_mb"] * MB
+    chunk_size = args.chunk_mb * MB
+    chunk = upload_payload(chunk_size)
+    name = f"upload-{rng.randrange(1 << 30)}.mp4"
+    status, session = json_request(driver, "POST", "/api/upload-sessions", {
+        "folderId": "Gallery/Uploads", "filename": name, "fileSize": file_size, "chunkSize": chunk_size,
+    })
+    if status != 201:
+        return {"error": f"session create returned {status}"}
+    session_id = session["sessionId"]
+    total_chunks = -(-file_size // chunk_size)
+
+    def chunk_op(index):
+        length = min(chunk_size, file_size - index * chunk_size)
+        def op():
+            status, _, _ = driver.request("PUT", f"/api/upload-sessions/{session_id}/chunks/{index}",
+                                          headers={"Content-Type": "application/octet-stream"}, data=chunk[:length])
+            return status, length
+        return op
+
+    result = timed_ops([chunk_op(i) for i in range(total_chunks)], args.concurrency)
+    start = time.perf_counter()
+    status, _ = json_request(driver, "POST", f"/api/upload-sessions/{session_id}/complete", {})
+    result["complete_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    result["complete_status"] = status
+    return result
+
+
+def scenario_upload_chunk(driver, params, args, rng):
+    if not isinstance(driver, TestClientDriver):
+        return {"skipped": "multipart upload is only driven in-process"}
+    file_size = params["upload_mb"] * MB
+    chunk_size = args.chunk_mb * MB
+    chunk = upload_payload(chunk_size)
+    name = f"legacy-{rng.randrange(1 << 30)}.mp4"
+    total_chunks = -(-file_size // chunk_size)
+
+    def chunk_op(index):
+        length = min(chunk_size, file_size - index * chunk_size)
+        def op():
+            status, _, _ = driver.request("POST", "/api/upload-chunk", data={
+                "file": (io.BytesIO(chunk[:length]), "blob"), "filename": name, "chunkIndex": str(index),
+                "totalChunks": str(total_chunks), "folderId": "Gallery/Uploads",
+                "chunkSize": str(chunk_size), "fileSize": str(file_size),
+            })
+            return status, length
+        return op
+
+    # The legacy API completes on whichever request delivers the last missing chunk
+    return timed_ops([chunk_op(i) for i in range(total_chunks)], args.concurrency)
+
+
+def scenario_zip_download(driver, params, args, rng):
+    names = [f"img{j:04d}.jpg" for j in range(params["files_per_folder"])]
+
+    def zip_op(folder):
+        def op():
+            status, size, _ = driver.request("POST", "/api/download-zip", json_body={"folderId": folder, "filenames": names})
+            return status, size
+        return op
+
+    ops = [zip_op(leaf_folder(rng.randrange(params["folders"]))) for _ in range(args.zip_requests)]
+    return timed_ops(ops, min(args.concurrency, args.zip_requests))
+
+
+SCENARIO_FUNCS = {
+    "listing": scenario_listing,
+    "listing_recursive": scenario_listing_recursive,
+    "image_get": scenario_image_get,
+    "range_get": scenario_range_get,
+    "upload_sessions": scenario_upload_sessions,
+    "upload_chunk": scenario_upload_chunk,
+    "zip_download": scenario_zip_download,
+}
+
+
+def run_in_process(name, params, args):
+    """Runs one scenario inside this (child) interpreter against <tree>/Images."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import server
+
+    with server.app.app_context():
+        server.migrate_database()
+        server.seed_database()
+        catalogued = server.db.session.query(server.MediaFile.id).first() is not None
+    if name == "catalog":
+        start = time.perf_counter()
+        with server.app.app_context():
+            stats = server.reconcile_catalog()
+        return {"seconds": round(time.perf_counter() - start, 3), **stats, "peak_rss_mb": peak_rss_mb()}
+    if not catalogued:
+        with server.app.app_context():
+            server.reconcile_catalog()
+    server.create_app(start_jobs=False)
+    driver = TestClientDriver(server)
+    login(driver, args.email, args.password)
+    result = SCENARIO_FUNCS[name](driver, params, args, random.Random(args.seed))
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="tree and payload sizes")
+    parser.add_argument("--tree", help="directory for the synthetic tree (default: a new temp dir)")
+    parser.add_argument("--folders", type=int, help="leaf folders (overrides the preset)")
+    parser.add_argument("--files-per-folder", type=int, help="files per leaf folder (overrides the preset)")
+    parser.add_argument("--videos", type=int, help="sparse video files (overrides the preset)")
+    parser.add_argument("--video-mb", type=int, help="size of each video (overrides the preset)")
+    parser.add_argument("--upload-mb", type=int, help="size of the uploaded file (overrides the preset)")
+    parser.add_argument("--copy-files", action="store_true", help="write real copies instead of hardlinks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    parser.add_argument("--requests", type=int, default=500, help="requests per GET scenario")
+    parser.add_argument("--zip-requests", type=int, default=5, help="zip downloads to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous clients")
+    parser.add_argument("--range-kb", type=int, default=1024, help="bytes per range request, in KiB")
+    parser.add_argument("--chunk-mb", type=int, default=8, help="upload chunk size")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for request selection")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process test client")
+    parser.add_argument("--email", default=os.getenv("ADMIN_EMAIL", "dharani080905@gmail.com"), help="login for authenticated scenarios")
+    parser.add_argument("--password", default="Admin@123", help="password for --email")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    tree = os.path.abspath(args.tree or tempfile.mkdtemp(prefix="bench-media-"))
+
+    if args.child:
+        result = run_in_process(args.child, params, args)
+        with open(args.child_output, "w") as f:
+            json.dump(result, f)
+        # Uploads kick the metadata backfill on a daemon thread, which may start its process
+        # pool after the scenario returns; let it finish so the pool shuts its workers down,
+        # then stop anything left (thumbnail workers) and skip the interpreter shutdown
+        import server  # already imported by run_in_process
+        server.metadata_backfill.join()
+        server.content_hash_backfill.join()
+        for proc in multiprocessing.active_children():
+            proc.terminate()
+        os._exit(0)
+
+    os.makedirs(tree, exist_ok=True)
+    build_tree(tree, params, args.copy_files)
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in names if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = {
+        "preset": args.preset, "tree": tree, "params": params, "concurrency": args.concurrency,
+        "target": args.url or "test-client", "cpus": os.cpu_count(), "scenarios": [],
+    }
+    driver = None
+    if args.url:
+        driver = HttpDriver(args.url)
+        login(driver, args.email, args.password)
+    env = dict(os.environ)
+    env.setdefault("JWT_SECRET_KEY", "bench-secret")
+    env.update({
+        "IMAGES_PATH": os.path.join(tree, "Images"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(tree, 'bench.db')}",
+        "CATALOG_RECONCILE_SECONDS": "0",
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    passthrough = [a for a in sys.argv[1:] if a != "--tree" and not a.startswith("--tree=")]
+    if "--tree" in sys.argv[1:]:
+        i = sys.argv.index("--tree")
+        passthrough = sys.argv[1:i] + sys.argv[i + 2:]
+
+    for name in names:
+        if driver is not None:
+            if name == "catalog":
+                continue  # the running server owns its catalog
+            result = SCENARIO_FUNCS[name](driver, params, args, random.Random(args.seed))
+            result["peak_rss_mb"] = None
+        else:
+            # The child reports through a file and logs to one: a straggling grandchild that
+            # inherited a pipe would keep the read open and hang this loop
+            result_path = os.path.join(tree, f".bench-{name}.json")
+            with tempfile.TemporaryFile(mode="w+") as log:
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), *passthrough, "--tree", tree,
+                     "--child", name, "--child-output", result_path],
+                    env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                )
+                if out.returncode != 0:
+                    log.seek(0)
+                    raise SystemExit(f"scenario {name} failed:\n{log.read()}")
+            with open(result_path) as f:
+                result = json.load(f)
+            os.remove(result_path)
+        results["scenarios"].append({"scenario": name, **result})
+        summary = ", ".join(f"{k}={result[k]}" for k in ("skipped", "error", "req_per_sec", "mb_per_sec", "p99_ms", "seconds", "peak_rss_mb") if result.get(k) is not None)
+        print(f"{name}: {summary}", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
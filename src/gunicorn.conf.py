@@ -0,0 +1,32 @@
+"""Production gunicorn settings for server.py.
+
+Run from src/ after migrating once per deploy:
+    flask --app server init-db
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) and forked, so workers start
+without re-importing anything. Each worker is a gthread worker: media streaming and
+bcrypt release the GIL, so a few processes with several threads each keep CPUs busy
+without multiplying per-process caches. Windows hosts can use waitress instead:
+    waitress-serve --port=8087 --threads=8 --call server:create_app
+"""
+import importlib
+import multiprocessing
+import os
+
+wsgi_app = "server:create_app(start_jobs=False)"
+bind = f"0.0.0.0:{os.getenv('PORT', '8087')}"
+preload_app = True
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(4, multiprocessing.cpu_count() + 1))))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Large uploads and range-sliced video responses can hold a thread for a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    # Background threads and pools must be created in the worker, not the preloading master.
+    # Every worker asks; only the one holding the jobs lock file runs them (BACKGROUND_JOBS).
+    importlib.import_module("server").start_background_jobs()
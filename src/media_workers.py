@@ -0,0 +1,334 @@
+"""Process-pool workers for server.py.
+
+Everything here runs in child processes, so this module must stay importable
+without side effects: no Flask app, no database, no env loading.
+"""
+import base64
+import calendar
+import io
+import os
+import struct
+import time
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; callers fall back to serving originals
+    Image = None
+    ImageOps = None
+
+
+def available_variant_formats():
+    """Transcode targets ("webp", "avif") this Pillow build can encode."""
+    if Image is None:
+        return set()
+    from PIL import features
+    return {fmt for fmt in ("webp", "avif") if features.check(fmt)}
+
+
+def _prepare(img, fmt):
+    # Convert before resizing: palette images only resample with NEAREST
+    if fmt == "JPEG":
+        return img if img.mode in ("RGB", "L") else img.convert("RGB")
+    if img.mode in ("RGB", "RGBA", "L"):
+        return img
+    return img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
+
+
+def _save(img, tmp_path, fmt, quality):
+    if fmt == "JPEG":
+        img.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        img.save(tmp_path, "WEBP", quality=quality, method=4)
+    elif fmt == "AVIF":
+        # speed 8 keeps full-size encodes in the low seconds at a small size cost
+        img.save(tmp_path, "AVIF", quality=quality, speed=8)
+    else:
+        raise ValueError(f"Unsupported output format {fmt}")
+
+
+def render_thumbnail(src_path, dest_path, size, quality=82, fmt="JPEG"):
+    """Resize src_path so its longest edge is at most `size` px and write it to dest_path as `fmt`."""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    with Image.open(src_path) as img:
+        # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale, skipping most of the IDCT work
+        img.draft("RGB", (size, size))
+        img = _prepare(ImageOps.exif_transpose(img), fmt)
+        img.thumbnail((size, size), Image.LANCZOS)
+        _save(img, tmp_path, fmt, quality)
+    os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+
+def render_variant(src_path, dest_path, fmt, quality):
+    """Transcode src_path at full resolution to `fmt` (WEBP or AVIF), applying EXIF orientation."""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    with Image.open(src_path) as img:
+        img = _prepare(ImageOps.exif_transpose(img), fmt)
+        _save(img, tmp_path, fmt, quality)
+    os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+
+# Metadata
+# Everything below reads headers only: Pillow parses dimensions and EXIF without decoding
+# pixels, and the video parsers walk container boxes/elements with seeks.
+EXIF_IFD_POINTER = 0x8769
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+MP4_EPOCH_OFFSET = 2082844800  # seconds between 1904-01-01 and 1970-01-01
+
+
+def extract_metadata(path, kind, placeholder_size=16):
+    """Returns width, height, orientation, taken_at (epoch seconds), camera, duration and
+    placeholder for path.
+
+    placeholder is a data: URI of the image shrunk to at most `placeholder_size` px, or
+    None for videos and when placeholder_size is 0. Unknown values are None. Parse errors
+    are swallowed so a damaged file is recorded as "no metadata" instead of being retried
+    forever.
+    """
+    meta = {
+        "width": None, "height": None, "orientation": None, "taken_at": None, "camera": None,
+        "duration": None, "placeholder": None,
+    }
+    try:
+        if kind == "video":
+            meta.update(_video_metadata(path))
+        elif Image is not None:
+            meta.update(_image_metadata(path, placeholder_size))
+    except Exception:
+        pass
+    return meta
+
+
+def _exif_time(value):
+    try:
+        return calendar.timegm(time.strptime(str(value).strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S"))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _placeholder(img, size):
+    # draft() lets JPEGs decode at 1/8 scale; reduce() then box-averages whole pixel blocks
+    # in C, which is both the cheapest and the smoothest filter at this ratio
+    img.draft("RGB", (size, size))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
+    factor = max(1, max(img.size) // size)
+    if factor > 1:
+        img = img.reduce(factor)
+    img.thumbnail((size, size), Image.BOX)
+    buf = io.BytesIO()
+    if "webp" in available_variant_formats():
+        img.save(buf, "WEBP", quality=40)
+        mimetype = "image/webp"
+    else:
+        img.convert("RGB").save(buf, "JPEG", quality=40)
+        mimetype = "image/jpeg"
+    return f"data:{mimetype};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+
+
+def _image_metadata(path, placeholder_size):
+    with Image.open(path) as img:
+        width, height = img.size
+        exif = img.getexif()
+        placeholder = _placeholder(img, placeholder_size) if placeholder_size else None
+    orientation = exif.get(EXIF_ORIENTATION)
+    if orientation in (5, 6, 7, 8):
+        # Rotated 90/270 degrees: report the size the image is displayed at
+        width, height = height, width
+    make = str(exif.get(EXIF_MAKE) or "").strip("\x00 ")
+    model = str(exif.get(EXIF_MODEL) or "").strip("\x00 ")
+    camera = model if model.lower().startswith(make.lower()) else f"{make} {model}".strip()
+    taken = exif.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    return {
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "taken_at": _exif_time(taken) if taken else None,
+        "camera": camera[:120] or None,
+        "placeholder": placeholder,
+    }
+
+
+def _video_metadata(path):
+    ext = path.rsplit(".", 1)[-1].lower()
+    with open(path, "rb") as f:
+        if ext in ("mp4", "mov"):
+            return _mp4_metadata(f)
+        if ext in ("mkv", "webm"):
+            return _ebml_metadata(f)
+        if ext == "avi":
+            return _avi_metadata(f)
+    return {}
+
+
+def _mp4_boxes(f, start, end):
+    # Yields (type, payload offset, payload end) for the boxes in [start, end)
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        payload = offset + 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            payload += 8
+        elif size == 0:
+            size = end - offset
+        if size < payload - offset:
+            return
+        yield box_type, payload, min(offset + size, end)
+        offset += size
+
+
+def _mp4_metadata(f):
+    f.seek(0, os.SEEK_END)
+    file_end = f.tell()
+    meta = {}
+    for box_type, start, end in _mp4_boxes(f, 0, file_end):
+        if box_type != b"moov":
+            continue
+        for child, cstart, cend in _mp4_boxes(f, start, end):
+            if child == b"mvhd":
+                f.seek(cstart)
+                version = f.read(1)[0]
+                f.read(3)
+                if version == 1:
+                    created, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+                else:
+                    created, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+                if timescale:
+                    meta["duration"] = round(duration / timescale, 3)
+                if created > MP4_EPOCH_OFFSET:
+                    meta["taken_at"] = created - MP4_EPOCH_OFFSET
+            elif child == b"trak" and "width" not in meta:
+                for grandchild, gstart, _ in _mp4_boxes(f, cstart, cend):
+                    if grandchild != b"tkhd":
+                        continue
+                    f.seek(gstart)
+                    version = f.read(1)[0]
+                    # Skip flags, times, ids and duration, then layer/group/volume and the matrix
+                    f.seek(gstart + (88 if version == 1 else 76))
+                    width, height = struct.unpack(">II", f.read(8))
+                    if width and height:
+                        meta["width"], meta["height"] = width >> 16, height >> 16
+        break
+    return meta
+
+
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_VIDEO = 0xE0
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_DATE_UTC = 0x4461
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+EBML_CLUSTER = 0x1F43B675
+MKV_EPOCH_OFFSET = 978307200  # seconds between 1970-01-01 and 2001-01-01
+
+
+def _ebml_vint(f, keep_marker):
+    first = f.read(1)
+    if not first:
+        raise EOFError
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first[0] & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError("Invalid EBML variable-length integer")
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in f.read(length - 1):
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+
+def _ebml_elements(f, start, end):
+    offset = start
+    while offset < end:
+        f.seek(offset)
+        try:
+            element_id, _ = _ebml_vint(f, keep_marker=True)
+            size, unknown = _ebml_vint(f, keep_marker=False)
+        except EOFError:
+            return
+        payload = f.tell()
+        size = end - payload if unknown else size
+        yield element_id, payload, size
+        offset = payload + size
+
+
+def _ebml_uint(f, start, size):
+    f.seek(start)
+    return int.from_bytes(f.read(size), "big")
+
+
+def _ebml_metadata(f):
+    f.seek(0, os.SEEK_END)
+    file_end = f.tell()
+    meta = {}
+    for element_id, start, size in _ebml_elements(f, 0, file_end):
+        if element_id != EBML_SEGMENT:
+            continue
+        scale, duration = 1000000, None
+        for child, cstart, csize in _ebml_elements(f, start, start + size):
+            if child == EBML_CLUSTER:
+                break  # media data from here on; all headers we need come first
+            if child == EBML_INFO:
+                for item, istart, isize in _ebml_elements(f, cstart, cstart + csize):
+                    if item == EBML_TIMECODE_SCALE:
+                        scale = _ebml_uint(f, istart, isize)
+                    elif item == EBML_DURATION:
+                        f.seek(istart)
+                        duration = struct.unpack(">f" if isize == 4 else ">d", f.read(isize))[0]
+                    elif item == EBML_DATE_UTC and isize == 8:
+                        f.seek(istart)
+                        nanoseconds = struct.unpack(">q", f.read(8))[0]
+                        meta["taken_at"] = nanoseconds // 1000000000 + MKV_EPOCH_OFFSET
+            elif child == EBML_TRACKS and "width" not in meta:
+                for entry, estart, esize in _ebml_elements(f, cstart, cstart + csize):
+                    if entry != EBML_TRACK_ENTRY:
+                        continue
+                    for item, istart, isize in _ebml_elements(f, estart, estart + esize):
+                        if item != EBML_VIDEO:
+                            continue
+                        for prop, pstart, psize in _ebml_elements(f, istart, istart + isize):
+                            if prop == EBML_PIXEL_WIDTH:
+                                meta["width"] = _ebml_uint(f, pstart, psize)
+                            elif prop == EBML_PIXEL_HEIGHT:
+                                meta["height"] = _ebml_uint(f, pstart, psize)
+        if duration is not None:
+            meta["duration"] = round(duration * scale / 1e9, 3)
+        break
+    return meta
+
+
+def _avi_metadata(f):
+    header = f.read(88)
+    if len(header) < 88 or header[0:4] != b"RIFF" or header[8:12] != b"AVI " or header[24:28] != b"avih":
+        return {}
+    usec_per_frame, = struct.unpack("<I", header[32:36])
+    total_frames, = struct.unpack("<I", header[48:52])
+    width, height = struct.unpack("<II", header[64:72])
+    return {
+        "duration": round(usec_per_frame * total_frames / 1e6, 3) if usec_per_frame else None,
+        "width": width or None,
+        "height": height or None,
+    }
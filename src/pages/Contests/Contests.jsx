@@ -268,6 +268,8 @@ export default function Contests() {
           formData.append('filename', file.name);
           formData.append('chunkIndex', chunkIndex);
           formData.append('totalChunks', totalChunks);
+          formData.append('chunkSize', chunkSize);
+          formData.append('fileSize', file.size);
           formData.append('folderId', folderId);
 
           const url = `${API_BASE_URL}/api/upload-chunk`;
@@ -29,6 +29,7 @@ import { toggleSelectImageHelper, selectAllHelper, clearSelectionHelper } from '
 import { v4 as uuidv4 } from 'uuid';
 
 const rootParts = normalizePathParts(ROOT_FOLDER);
+const ADMIN_LOGS_PAGE_SIZE = 100;
 
 export default function Gallery() {
   const [folders, setFolders] = useState([]);
@@ -51,6 +52,7 @@ export default function Gallery() {
   // Admin Dashboard States & API Methods
   const [adminUsers, setAdminUsers] = useState([]);
   const [adminLogs, setAdminLogs] = useState([]);
+  const [adminLogsCursor, setAdminLogsCursor] = useState(null);
   const [adminActiveTab, setAdminActiveTab] = useState('users'); // 'users' or 'logs'
   const [adminLoading, setAdminLoading] = useState(false);
 
@@ -61,10 +63,11 @@ export default function Gallery() {
       const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` };
       const [usersRes, logsRes] = await Promise.all([
         axios.get(`${API_BASE_URL}/api/admin/users`, { headers }),
-        axios.get(`${API_BASE_URL}/api/admin/logs`, { headers })
+        axios.get(`${API_BASE_URL}/api/admin/logs`, { headers, params: { limit: ADMIN_LOGS_PAGE_SIZE } })
       ]);
       setAdminUsers(usersRes.data || []);
-      setAdminLogs(logsRes.data || []);
+      setAdminLogs(logsRes.data?.logs || []);
+      setAdminLogsCursor(logsRes.data?.nextCursor || null);
     } catch (err) {
       console.error("Failed to fetch admin dashboard data:", err);
     } finally {
@@ -72,6 +75,24 @@ export default function Gallery() {
     }
   }, [isAdmin]);
 
+  const loadMoreAdminLogs = async () => {
+    if (!adminLogsCursor) return;
+    setAdminLoading(true);
+    try {
+      const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` };
+      const res = await axios.get(`${API_BASE_URL}/api/admin/logs`, {
+        headers,
+        params: { limit: ADMIN_LOGS_PAGE_SIZE, cursor: adminLogsCursor }
+      });
+      setAdminLogs(prev => [...prev, ...(res.data?.logs || [])]);
+      setAdminLogsCursor(res.data?.nextCursor || null);
+    } catch (err) {
+      console.error("Failed to load more activity logs:", err);
+    } finally {
+      setAdminLoading(false);
+    }
+  };
+
   useEffect(() => {
     if (isAdminModalOpen) {
       fetchAdminData();
@@ -313,6 +334,8 @@ export default function Gallery() {
           formData.append('filename', file.name);
           formData.append('chunkIndex', chunkIndex);
           formData.append('totalChunks', totalChunks);
+          formData.append('chunkSize', chunkSize);
+          formData.append('fileSize', file.size);
           formData.append('folderId', folderId);
 
           const url = `${API_BASE_URL}/api/upload-chunk`;
@@ -770,6 +793,13 @@ export default function Gallery() {
                     )}
                   </tbody>
                 </table>
+                {adminLogsCursor && (
+                  <div style={{ textAlign: 'center', padding: '10px 0' }}>
+                    <button className="btn" onClick={loadMoreAdminLogs} disabled={adminLoading}>
+                      {adminLoading ? 'Loading...' : 'Load older entries'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
             <div style={{ marginTop: 20, textAlign: 'right' }}>
@@ -35,6 +35,7 @@ const ImageGrid = ({ images, selectMode, selectedIds, onImageClick, onImageDelet
                 src={image.thumbnail}
                 alt={image.name}
                 loading="lazy"
+                style={image.placeholder ? { backgroundImage: `url(${image.placeholder})`, backgroundSize: 'cover', backgroundPosition: 'center' } : undefined}
                 onError={e => e.currentTarget.src = FALLBACK_IMG}
               />
             );
@@ -34,6 +34,7 @@ export default async function fetchImagesFn({
         name: img.name || `image_${idx}`,
         url: img.url || img.thumbnail,
         thumbnail: img.thumbnail || img.url,
+        placeholder: img.placeholder || null,
         raw: img,
       }));
     setImagesAll(filtered);
@@ -5,7 +5,6 @@ import "./Featuredphotos.css";
 
 // --- Configuration ---
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || "http://localhost:8087";
-const FEATURE_FOLDER = "Feature";
 const AUTOPLAY_INTERVAL = 5000; // 5 seconds for a more relaxed pace
 
 // --- Custom Hook for Interval with Hover Pause ---
@@ -48,10 +47,10 @@ const Featuredphotos = () => {
   useEffect(() => {
     const fetchCategories = async () => {
       try {
-        const response = await axios.get(`${API_BASE_URL}/api/folders/${FEATURE_FOLDER}`);
-        const subfolders = response.data?.subfolders || [];
-        if (Array.isArray(subfolders)) {
-          setCategories(["All", ...subfolders]);
+        const response = await axios.get(`${API_BASE_URL}/api/featured`);
+        const featured = response.data?.categories || [];
+        if (Array.isArray(featured)) {
+          setCategories(["All", ...featured]);
         }
       } catch (error) {
         console.error("Error fetching categories:", error);
@@ -74,16 +73,15 @@ const Featuredphotos = () => {
 
         if (activeCategory === "All") {
           // Fetch categories again to ensure we have the list of subfolders
-          const catResponse = await axios.get(`${API_BASE_URL}/api/folders/${FEATURE_FOLDER}`);
-          const subfolders = catResponse.data?.subfolders || [];
+          const catResponse = await axios.get(`${API_BASE_URL}/api/featured`);
+          const subfolders = catResponse.data?.categories || [];
 
           if (subfolders.length === 0) {
             throw new Error("No categories found to fetch images from.");
           }
 
           const imagePromises = subfolders.map(folder => {
-            const path = `${FEATURE_FOLDER}/${encodeURIComponent(folder)}`;
-            return axios.get(`${API_BASE_URL}/api/images/${path}`).then(res => 
+            return axios.get(`${API_BASE_URL}/api/featured/${encodeURIComponent(folder)}`).then(res => 
               // Add category metadata to each photo object
               (res.data || []).map(photo => ({ ...photo, category: folder }))
             );
@@ -93,8 +91,7 @@ const Featuredphotos = () => {
           fetchedImages = results.flat();
 
         } else {
-          const path = `${FEATURE_FOLDER}/${encodeURIComponent(activeCategory)}`;
-          const response = await axios.get(`${API_BASE_URL}/api/images/${path}`);
+          const response = await axios.get(`${API_BASE_URL}/api/featured/${encodeURIComponent(activeCategory)}`);
           fetchedImages = (response.data || []).map(photo => ({ ...photo, category: activeCategory }));
         }
 
@@ -4,7 +4,6 @@ import axios from 'axios';
 import './Hero.css';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || "http://localhost:8087";
-const HERO_FOLDER = "Hero"; // Define the folder name
 
 const Hero = () => {
   const [images, setImages] = useState([]);
@@ -20,7 +19,7 @@ const Hero = () => {
       setIsLoading(true);
       setError(null); // Reset error on fetch
       try {
-        const response = await axios.get(`${API_BASE_URL}/api/images/${HERO_FOLDER}`);
+        const response = await axios.get(`${API_BASE_URL}/api/hero`);
         if (response.data && Array.isArray(response.data) && response.data.length > 0) {
           // Preload images slightly for smoother transition (optional but good)
           response.data.forEach(img => {
@@ -1,24 +1,66 @@
-from flask import Flask, jsonify, send_file, abort, request, send_from_directory
+from flask import Flask, Response, g, jsonify, send_file, abort, request, stream_with_context
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity as _get_jwt_identity
 import os
 import shutil
 from mimetypes import guess_type
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
 from functools import wraps
 from dotenv import load_dotenv
+import inspect
 import json
+import re
+import csv
+import io
+import atexit
+import queue
+from urllib.parse import quote
+import uuid
+import base64
+import struct
+import zlib
+import filecmp
+import hashlib
+import hmac
+import ipaddress
+import threading
+import time
+import cProfile
+import random
+import sys
+try:
+    import fcntl
+except ImportError:  # Windows: reflinks unavailable, hardlinks still work
+    fcntl = None
+try:
+    import redis
+except ImportError:  # only needed for RATE_LIMIT_STORAGE_URL=redis://...
+    redis = None
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from collections import Counter, OrderedDict, deque
+import media_workers
 
 def get_jwt_identity():
+    # Decorators, handlers and log_activity all ask for the identity; decode the subject once per request
+    memo = g.get('_jwt_identity')
+    if memo is not None:
+        return memo
     val = _get_jwt_identity()
     if isinstance(val, str):
         try:
-            return json.loads(val)
+            val = json.loads(val)
         except Exception:
-            return val
+            pass
+    if val is not None:
+        g._jwt_identity = val
     return val
 
 # Load env
@@ -34,7 +76,45 @@ app = Flask(__name__)
 # Config
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///site.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Database connections. SQLite runs in WAL mode so readers never block the writer and
+# commits skip most fsyncs (synchronous=NORMAL); writers queue on a busy timeout instead
+# of failing with "database is locked". Reads go to a separate read-only pool.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))  # 0 reads on the write pool
+# Server databases (PostgreSQL, MySQL): per-process pool sizing
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+if SQLITE_JOURNAL_MODE not in ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"):
+    raise RuntimeError(f"Unsupported SQLITE_JOURNAL_MODE {SQLITE_JOURNAL_MODE}")
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise RuntimeError(f"Unsupported SQLITE_SYNCHRONOUS {SQLITE_SYNCHRONOUS}")
+DB_IS_SQLITE = app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
+DB_IS_SQLITE_MEMORY = DB_IS_SQLITE and app.config["SQLALCHEMY_DATABASE_URI"].rstrip("/") in ("sqlite:", "sqlite:/:memory:", "sqlite:///:memory:")
+if DB_IS_SQLITE:
+    # pysqlite's timeout is its busy handler; the pragmas are set per connection below
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    if SQLITE_READ_POOL_SIZE > 0 and not DB_IS_SQLITE_MEMORY:
+        app.config["SQLALCHEMY_BINDS"] = {"read": {
+            "url": app.config["SQLALCHEMY_DATABASE_URI"],
+            "pool_size": SQLITE_READ_POOL_SIZE,
+            "max_overflow": SQLITE_READ_POOL_SIZE,
+        }}
+else:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100MB upload limit
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
 
 @app.after_request
 def add_security_headers(response):
@@ -60,6 +140,146 @@ else:
 
 os.makedirs(BASE_PATH, exist_ok=True)
 ALLOWED_EXTENSIONS = set(os.getenv("ALLOWED_EXTENSIONS", "png,jpg,jpeg,gif,mp4,mov,avi,mkv,webm").split(","))
+VIDEO_EXTENSIONS = {"mp4", "mov", "avi", "mkv", "webm"}
+CATALOG_RECONCILE_SECONDS = int(os.getenv("CATALOG_RECONCILE_SECONDS", "300"))
+# Periodic jobs (reconcile, backfills, retention) run in one process per host. "leader":
+# whichever worker holds the lock file runs them and the others wait to take over.
+# "off": web workers run none; start `flask --app server run-jobs` as its own process.
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "leader").strip().lower()
+if BACKGROUND_JOBS not in ("leader", "off"):
+    raise RuntimeError("BACKGROUND_JOBS must be 'leader' or 'off'.")
+BACKGROUND_JOBS_LOCK = os.path.join(BASE_PATH, '.cache', 'background-jobs.lock')
+BACKGROUND_JOBS_RETRY_SECONDS = 30
+
+# Thumbnails: longest-edge sizes in px, cached under BASE_PATH/.cache/thumbs
+THUMB_SIZES = tuple(int(s) for s in os.getenv("THUMB_SIZES", "320,640,1280").split(","))
+THUMB_GRID_SIZE = int(os.getenv("THUMB_GRID_SIZE", "640"))
+THUMB_CACHE_DIR = os.path.join(BASE_PATH, '.cache', 'thumbs')
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_MB", "2048")) * 1024 * 1024
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+THUMB_TIMEOUT = int(os.getenv("THUMB_TIMEOUT", "30"))
+
+# Accept-negotiated transcodes of JPEG/PNG originals, in server preference order.
+# Variants share the thumbnail cache directory and its size budget.
+VARIANT_MIMETYPES = {"avif": "image/avif", "webp": "image/webp"}
+VARIANT_QUALITY = {"avif": int(os.getenv("AVIF_QUALITY", "60")), "webp": int(os.getenv("WEBP_QUALITY", "80"))}
+VARIANT_SOURCE_EXTENSIONS = {"jpg", "jpeg", "png"}
+VARIANT_FORMATS = tuple(
+    f for f in (f.strip().lower() for f in os.getenv("IMAGE_VARIANT_FORMATS", "avif,webp").split(","))
+    if f in media_workers.available_variant_formats()
+)
+
+# HTTP caching for media responses; URLs carrying the current ?v= fingerprint are immutable
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "3600"))
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Open-ended video ranges ("bytes=N-") are answered in slices so a viewer can't hold a worker
+VIDEO_RANGE_CAP = int(os.getenv("VIDEO_RANGE_CAP_MB", "8")) * 1024 * 1024
+# Offload file bytes to the front web server: "" (serve from Python), "x-accel" (nginx) or "x-sendfile"
+MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "").strip().lower()
+MEDIA_OFFLOAD_PREFIX = os.getenv("MEDIA_OFFLOAD_PREFIX", "/_protected_media").rstrip('/')
+if MEDIA_OFFLOAD not in ("", "x-accel", "x-sendfile"):
+    raise RuntimeError("MEDIA_OFFLOAD must be empty, 'x-accel' or 'x-sendfile'.")
+
+# Activity log writer: records are queued and bulk-inserted off the request path
+ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv("ACTIVITY_LOG_QUEUE_SIZE", "10000"))
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "200"))
+ACTIVITY_LOG_FLUSH_SECONDS = float(os.getenv("ACTIVITY_LOG_FLUSH_SECONDS", "1.0"))
+ACTIVITY_LOG_ENQUEUE_TIMEOUT = float(os.getenv("ACTIVITY_LOG_ENQUEUE_TIMEOUT", "0.5"))
+# Opt-in retention: rows older than this many days move to activity_log_archive, which the
+# admin view only shows with ?archive=true. The default 0 keeps everything in the hot table.
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", "0"))
+
+# User lookups for auth paths; TTL bounds staleness across worker processes
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+# Rate limits: token buckets written as "<requests>/<second|minute|hour>"; the count is also
+# the burst size. Buckets live in process memory unless RATE_LIMIT_STORAGE_URL points at
+# Redis, which shares them across worker processes and hosts.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_STORAGE_URL = os.getenv("RATE_LIMIT_STORAGE_URL", "").strip()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries are trusted.
+# While unset (or 0) the header is ignored and buckets key on the socket address; unset
+# also logs a warning the first time the header shows up, since behind a proxy every
+# client then shares the proxy's bucket.
+RATE_LIMIT_PROXY_HOPS = int(os.environ["RATE_LIMIT_PROXY_HOPS"]) if os.getenv("RATE_LIMIT_PROXY_HOPS", "").strip() else None
+# An empty value disables that limit. Media limits are off by default: a gallery page
+# fetches 100+ thumbnails, and clients behind NAT share an address.
+RATE_LIMITS = {
+    'auth-ip': os.getenv("AUTH_IP_RATE_LIMIT", "30/minute"),
+    'auth-account': os.getenv("AUTH_ACCOUNT_RATE_LIMIT", "10/minute"),
+    'media-ip': os.getenv("MEDIA_IP_RATE_LIMIT", ""),
+}
+if RATE_LIMIT_STORAGE_URL and redis is None:
+    raise RuntimeError("RATE_LIMIT_STORAGE_URL is set but the redis package is not installed.")
+
+# Prometheus text metrics at /metrics. Counters live in this process, so with several
+# workers each scrape reports the worker that answered it. METRICS_TOKEN, when set, must
+# be sent as a bearer token; without it only direct loopback requests are answered, so
+# a scraper behind the proxy or on another host needs the token.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+# Profiling, off by default. PROFILE_SAMPLE_RATE (0-1) runs cProfile on that fraction of
+# requests; PROFILE_SLOW_MS > 0 stack-samples every request and keeps a folded-stack
+# flamegraph for those slower than the threshold. Files land in PROFILE_DIR, oldest pruned.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "").strip() or os.path.join(BASE_PATH, '.cache', 'profiles')
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+if not 0 <= PROFILE_SAMPLE_RATE <= 1:
+    raise RuntimeError("PROFILE_SAMPLE_RATE must be between 0 and 1.")
+if PROFILE_SAMPLE_INTERVAL_MS <= 0:
+    raise RuntimeError("PROFILE_SAMPLE_INTERVAL_MS must be positive.")
+
+# Requests slower than this are kept in an in-memory ring buffer and logged (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", "200"))
+
+# Public JSON responses (members list) cached in-process; TTL bounds staleness across workers
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Hero/Feature placements: "reference" stores a row pointing at the original; "link" first
+# tries a hardlink or reflink into Hero/ or Feature/<category>/ and falls back to a reference
+PLACEMENT_MODE = os.getenv("PLACEMENT_MODE", "reference").strip().lower()
+if PLACEMENT_MODE not in ("reference", "link"):
+    raise RuntimeError("PLACEMENT_MODE must be 'reference' or 'link'.")
+
+# Content hashing: SHA-256 of every upload is computed while it streams to disk.
+# DEDUP_MODE=hardlink replaces a new file with a hardlink to an identical catalogued one.
+DEDUP_MODE = os.getenv("DEDUP_MODE", "off").strip().lower()
+if DEDUP_MODE not in ("off", "hardlink"):
+    raise RuntimeError("DEDUP_MODE must be 'off' or 'hardlink'.")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_BACKFILL_ON_START = os.getenv("HASH_BACKFILL_ON_START", "true").lower() in ("1", "true", "yes")
+
+# Media metadata (dimensions, EXIF, duration) read from file headers in a process pool.
+# Bump METADATA_VERSION when extraction changes to re-extract every file.
+METADATA_VERSION = 2
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", "2"))
+METADATA_BACKFILL_ON_START = os.getenv("METADATA_BACKFILL_ON_START", "true").lower() in ("1", "true", "yes")
+# Longest edge in px of the inline blur-up placeholder stored per image (0 disables)
+PLACEHOLDER_SIZE = int(os.getenv("PLACEHOLDER_SIZE", "16"))
+
+# Resumable uploads: one directory per session under BASE_PATH/.temp_chunks
+UPLOAD_SESSIONS_DIR = os.path.join(BASE_PATH, '.temp_chunks')
+UPLOAD_DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+# Session bounds: the bitmap holds a byte per chunk and the data file is preallocated, so
+# both are capped before anything is written to disk
+UPLOAD_MIN_CHUNK_SIZE = int(os.getenv("UPLOAD_MIN_CHUNK_KB", "256")) * 1024
+UPLOAD_MAX_CHUNKS = int(os.getenv("UPLOAD_MAX_CHUNKS", "10000"))
+UPLOAD_MAX_FILE_SIZE = int(os.getenv("UPLOAD_MAX_FILE_MB", "10240")) * 1024 * 1024
+
+# Bulk file operations: most operations accepted in one /api/files/bulk request
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", "1000"))
+
+# Folder tree: /api/tree returns nested folders up to TREE_MAX_DEPTH levels per call.
+# Per-folder aggregates are cached for up to TREE_CACHE_MAX_FOLDERS directories.
+TREE_MAX_DEPTH = int(os.getenv("TREE_MAX_DEPTH", "16"))
+TREE_CACHE_MAX_FOLDERS = int(os.getenv("TREE_CACHE_MAX_FOLDERS", "20000"))
 
 # CORS Origins
 allowed_origins = [
@@ -82,10 +302,482 @@ CORS(
     resources={r"/*": {"origins": allowed_origins}},
 )
 
-db = SQLAlchemy(app)
+# Database Sessions
+class RoutingSession(FlaskSession):
+    """Sends plain SELECTs to the read pool until the session writes.
+
+    Once a transaction has flushed or run DML, everything up to the next commit or
+    rollback stays on the write connection so the session reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('wrote') and getattr(clause, 'is_select', False):
+            read_engine = self._db.engines.get('read')
+            if read_engine is not None:
+                return read_engine
+        self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self.info.pop('wrote', None)
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self.info.pop('wrote', None)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.info.pop('wrote', None)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 
+def sqlite_connection_pragmas(read_only):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        else:
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.close()
+    return on_connect
+
+if DB_IS_SQLITE:
+    with app.app_context():
+        event.listen(db.engine, 'connect', sqlite_connection_pragmas(read_only=False))
+        if 'read' in db.engines:
+            event.listen(db.engines['read'], 'connect', sqlite_connection_pragmas(read_only=True))
+
+# Metrics
+# A small in-process registry rendered in the Prometheus text format. Request hooks record
+# per-endpoint counts, latency (including generated bodies such as zips) and media
+# response bytes. Filesystem calls and SQL statements made while serving a request are
+# tallied in a thread-local and folded into the registry once per request, so the per-call
+# cost is a dict increment; SQL from background threads is counted as "background".
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MEDIA_ENDPOINTS = {
+    'get_image', 'get_image_top', 'get_thumb', 'download_image', 'download_image_top',
+    'download_zip', 'serve_member_photo',
+}
+UPLOAD_ENDPOINTS = {'upload_image', 'upload_chunk', 'upload_session_chunk', 'complete_upload_session'}
+
+class MetricsRegistry:
+    """Counters, gauges and histograms keyed by label values, plus scrape-time collectors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = OrderedDict()  # name -> (type, help, label names, buckets)
+        self._values = {}  # name -> {label values: float | [bucket counts..., sum, count]}
+        self._collectors = []
+
+    def register(self, name, kind, help_text, labels=(), buckets=None):
+        self._meta[name] = (kind, help_text, tuple(labels), buckets)
+        self._values[name] = {}
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            values = self._values[name]
+            values[labels] = values.get(labels, 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._values[name][labels] = value
+
+    def observe(self, name, labels, value):
+        buckets = self._meta[name][3]
+        with self._lock:
+            series = self._values[name].get(labels)
+            if series is None:
+                series = self._values[name][labels] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def collector(self, fn):
+        """fn() yields (name, type, help, [(labels dict, value), ...]) at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        with self._lock:
+            snapshot = [(name, meta, dict(self._values[name])) for name, meta in self._meta.items()]
+        for name, (kind, help_text, label_names, buckets), values in snapshot:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_values, value in sorted(values.items()):
+                labels = dict(zip(label_names, label_values))
+                if kind != 'histogram':
+                    lines.append(f"{name}{format_metric_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_metric_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_bucket{format_metric_labels({**labels, 'le': '+Inf'})} {value[-1]}")
+                lines.append(f"{name}_sum{format_metric_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{format_metric_labels(labels)} {value[-1]}")
+        for collect in self._collectors:
+            try:
+                for name, kind, help_text, samples in collect():
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in samples:
+                        lines.append(f"{name}{format_metric_labels(labels)} {value}")
+            except Exception as e:
+                print(f"Metrics collector error: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+def format_metric_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+metrics = MetricsRegistry()
+metrics.register('http_requests_total', 'counter', 'Requests handled, by endpoint, method and status.', ('endpoint', 'method', 'status'))
+metrics.register('http_request_duration_seconds', 'histogram', 'Time from request start until the response body was fully sent.', ('endpoint',), METRICS_BUCKETS)
+metrics.register('http_requests_in_progress', 'gauge', 'Requests currently being handled, including streaming bodies.', ('endpoint',))
+metrics.register('http_response_bytes_total', 'counter', 'Response body bytes sent by media endpoints.', ('endpoint',))
+metrics.register('fs_operations_total', 'counter', 'Filesystem calls made while serving requests; existence checks count as stat.', ('endpoint', 'op'))
+metrics.register('sql_queries_total', 'counter', 'SQL statements executed.', ('endpoint',))
+metrics.register('sql_query_seconds_total', 'counter', 'Time spent executing SQL statements.', ('endpoint',))
+metrics.register('bcrypt_duration_seconds', 'histogram', 'Time spent in bcrypt, excluding queueing.', ('op',), METRICS_BUCKETS)
+
+_request_io = threading.local()
+
+# Filesystem calls are counted in the app's own stat/scan helpers below rather than by
+# wrapping the os module, so libraries and background threads run unwrapped
+def count_fs_op(op, n=1):
+    counts = getattr(_request_io, 'fs', None)
+    if counts is not None:
+        counts[op] = counts.get(op, 0) + n
+
+def fs_stat(path):
+    count_fs_op('stat')
+    return os.stat(path)
+
+def fs_scandir(path):
+    count_fs_op('scandir')
+    return os.scandir(path)
+
+def fs_entry_stat(entry):
+    count_fs_op('stat')
+    return entry.stat()
+
+# Existence checks stat() the path too, so they count as 'stat'
+def fs_exists(path):
+    count_fs_op('stat')
+    return os.path.exists(path)
+
+def fs_isfile(path):
+    count_fs_op('stat')
+    return os.path.isfile(path)
+
+def fs_isdir(path):
+    count_fs_op('stat')
+    return os.path.isdir(path)
+
+# Profiling
+# Opt-in per-request profiles plus a slow-request log. cProfile is deterministic and costs
+# every call, so it only runs on a sampled fraction. The stack sampler instead reads
+# sys._current_frames() from one background thread every PROFILE_SAMPLE_INTERVAL_MS and
+# attributes each in-flight request thread's stack to that request, so it can watch every
+# request cheaply and only writes a profile for the slow ones. Folded stacks load straight
+# into flamegraph.pl, speedscope or inferno; .prof files open with pstats or snakeviz.
+PROFILE_NAME_RE = re.compile(r'^(\d+)-([\w.]+)-(\d+)ms-[0-9a-f]{8}\.(prof|folded)$')
+
+class RequestProfiler:
+    def __init__(self, sample_rate, slow_ms, interval_ms, directory, max_files, slow_log_ms, slow_log_size):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000.0
+        self.directory = directory
+        self.max_files = max_files
+        self.slow_log_ms = slow_log_ms
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.lock = threading.Lock()
+        self.active = {}  # thread ident -> Counter of folded stacks
+        self.thread = None
+        self.stats = {'cprofile': 0, 'sampled': 0, 'written': 0, 'slow': 0, 'errors': 0}
+
+    def begin(self):
+        """Start profiling the current request; returns a token for end()."""
+        # Skip when a profiler or debugger already owns this thread (or, on 3.12+, the interpreter)
+        if self.sample_rate and random.random() < self.sample_rate and sys.getprofile() is None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return None
+            return ('prof', profile)
+        if self.slow_ms > 0:
+            ident = threading.get_ident()
+            with self.lock:
+                self.active[ident] = Counter()
+                # Threads don't survive fork, so a gunicorn worker starts its own sampler here
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                    self.thread.start()
+            return ('folded', ident)
+        return None
+
+    def end(self, token, summary, duration):
+        """Stop profiling, save the profile if it qualifies, and record slow requests."""
+        duration_ms = duration * 1000
+        name = None
+        if token is not None:
+            kind, value = token
+            try:
+                if kind == 'prof':
+                    value.disable()
+                    name = self._write(value, 'prof', summary['endpoint'], duration_ms)
+                else:
+                    with self.lock:
+                        stacks = self.active.pop(value, None)
+                    if stacks and duration_ms >= self.slow_ms:
+                        name = self._write(stacks, 'folded', summary['endpoint'], duration_ms)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Profile write error: {str(e)}")
+        if self.slow_log_ms > 0 and duration_ms >= self.slow_log_ms:
+            entry = dict(summary, durationMs=round(duration_ms, 1), at=datetime.utcnow().isoformat(), profile=name)
+            with self.lock:
+                self.slow_log.append(entry)
+                self.stats['slow'] += 1
+            print(f"Slow request: {summary['method']} {summary['path']} ({summary['endpoint']}) "
+                  f"{duration_ms:.0f} ms, {summary['sqlQueries']} SQL, {summary['fsOps']} fs ops")
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                idents = [i for i in self.active if i != own]
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                folded = ';'.join(reversed(stack))
+                with self.lock:
+                    counts = self.active.get(ident)
+                    if counts is not None:
+                        counts[folded] += 1
+                        self.stats['sampled'] += 1
+
+    def _write(self, data, ext, endpoint, duration_ms):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{endpoint}-{int(duration_ms)}ms-{uuid.uuid4().hex[:8]}.{ext}"
+        path = os.path.join(self.directory, name)
+        if ext == 'prof':
+            data.dump_stats(path)
+            self.stats['cprofile'] += 1
+        else:
+            with open(path, 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in data.items())
+        self.stats['written'] += 1
+        self._prune()
+        return name
+
+    def _prune(self):
+        names = sorted(n for n in os.listdir(self.directory) if PROFILE_NAME_RE.match(n))
+        for old in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def list_profiles(self):
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in os.scandir(self.directory):
+            match = PROFILE_NAME_RE.match(entry.name)
+            if not match:
+                continue
+            created_ms, endpoint, duration_ms, kind = match.groups()
+            profiles.append({
+                'name': entry.name,
+                'kind': 'cprofile' if kind == 'prof' else 'folded',
+                'endpoint': endpoint,
+                'durationMs': int(duration_ms),
+                'size': entry.stat().st_size,
+                'createdAt': datetime.utcfromtimestamp(int(created_ms) / 1000).isoformat(),
+            })
+        profiles.sort(key=lambda p: p['name'], reverse=True)
+        return profiles
+
+    def slow_requests(self):
+        with self.lock:
+            return list(reversed(self.slow_log))
+
+request_profiler = RequestProfiler(
+    PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_DIR,
+    PROFILE_MAX_FILES, SLOW_REQUEST_MS, SLOW_REQUEST_LOG_SIZE,
+)
+
+# Request instrumentation feeds metrics, the profiler and the slow-request log
+REQUEST_INSTRUMENTATION = METRICS_ENABLED or PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_MS > 0 or SLOW_REQUEST_MS > 0
+
+if REQUEST_INSTRUMENTATION:
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _sql_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        sql = getattr(_request_io, 'sql', None)
+        if sql is not None:
+            sql[0] += 1
+            sql[1] += elapsed
+        elif METRICS_ENABLED:
+            metrics.inc('sql_queries_total', ('background',))
+            metrics.inc('sql_query_seconds_total', ('background',), elapsed)
+
+    @app.before_request
+    def start_request_instrumentation():
+        _request_io.fs = {}
+        _request_io.sql = [0, 0.0]
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = request.endpoint or 'unmatched'
+        g._request_profile = request_profiler.begin()
+        if METRICS_ENABLED:
+            metrics.inc('http_requests_in_progress', (g._metrics_endpoint,))
+
+    @app.after_request
+    def finish_request_instrumentation(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        endpoint = g._metrics_endpoint
+        fs_counts, sql = _request_io.fs, _request_io.sql
+        _request_io.fs = _request_io.sql = None
+        if METRICS_ENABLED:
+            metrics.inc('http_requests_total', (endpoint, request.method, str(response.status_code)))
+            for op, count in fs_counts.items():
+                metrics.inc('fs_operations_total', (endpoint, op), count)
+            if sql[0]:
+                metrics.inc('sql_queries_total', (endpoint,), sql[0])
+                metrics.inc('sql_query_seconds_total', (endpoint,), sql[1])
+            if endpoint in MEDIA_ENDPOINTS and response.content_length:
+                metrics.inc('http_response_bytes_total', (endpoint,), response.content_length)
+        profile = g.pop('_request_profile', None)
+        summary = {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'args': request.args.to_dict(flat=False),
+            'status': response.status_code,
+            'sqlQueries': sql[0],
+            'sqlMs': round(sql[1] * 1000, 2),
+            'fsOps': sum(fs_counts.values()),
+        }
+
+        def finished():
+            duration = time.perf_counter() - start
+            if METRICS_ENABLED:
+                metrics.observe('http_request_duration_seconds', (endpoint,), duration)
+                metrics.inc('http_requests_in_progress', (endpoint,), -1)
+            request_profiler.end(profile, summary, duration)
+        if not response.direct_passthrough:
+            response.call_on_close(finished)
+        elif inspect.isgenerator(response.response):
+            # Passthrough bodies skip call_on_close; time generated ones (zip) until exhausted
+            response.response = ClosingIterator(response.response, finished)
+        else:
+            finished()  # file wrapper: the WSGI server sends it, possibly with sendfile
+        return response
+
+# Password Hashing
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a small bounded thread pool.
+
+    bcrypt releases the GIL, so the pool caps how many cores hashing can take
+    while request threads keep serving media. At most `max_pending` hashes may
+    be running or queued; beyond that callers get PasswordHasherBusy (a 503)
+    instead of piling up behind a sign-up rush.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max(max_pending, workers))
+
+    def resize(self, workers):
+        old_pool = self._pool
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        old_pool.shutdown(wait=False)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _timed(op, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe('bcrypt_duration_seconds', (op,), time.perf_counter() - start)
+
+    def hash(self, *plaintexts):
+        # Several values (password and security answer) hash concurrently
+        futures = [self.submit(self._timed, 'hash', bcrypt.generate_password_hash, p) for p in plaintexts]
+        hashes = [f.result().decode("utf-8") for f in futures]
+        return hashes[0] if len(hashes) == 1 else hashes
+
+    def check(self, hashed, plaintext):
+        return self.submit(self._timed, 'check', bcrypt.check_password_hash, hashed, plaintext).result()
+
+    def needs_rehash(self, hashed):
+        # "$2b$12$..." -> 12; upgrade whenever the stored cost differs from the configured one
+        try:
+            return int(hashed.split('$')[2]) != app.config["BCRYPT_LOG_ROUNDS"]
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+password_hasher = PasswordHasher(BCRYPT_WORKERS, BCRYPT_MAX_PENDING)
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return jsonify({"success": False, "message": "Server is busy, please try again in a moment."}), 503
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -102,11 +794,20 @@ class User(db.Model):
 
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_email = db.Column(db.String(120), nullable=False)
+    action = db.Column(db.String(50), nullable=False, index=True)
+    details = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ActivityLogArchive(db.Model):
+    # Rows moved out of activity_log by the retention job; same shape, no hot-path indexes
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
     user_email = db.Column(db.String(120), nullable=False)
     action = db.Column(db.String(50), nullable=False)
     details = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime)
 
 class ClubMember(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -121,8 +822,57 @@ class ClubMember(db.Model):
     def __repr__(self):
         return f"<ClubMember {self.name}>"
 
-# Startup logic & schema migrations
-with app.app_context():
+class MediaFile(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(1024), unique=True, nullable=False) # relative to BASE_PATH, '/' separated
+    folder = db.Column(db.String(1024), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, default=0)
+    mtime = db.Column(db.Float, default=0)
+    kind = db.Column(db.String(10), default="image") # image, video
+    sha256 = db.Column(db.String(64), nullable=True, index=True) # NULL until hashed
+    width = db.Column(db.Integer, nullable=True) # as displayed, after EXIF orientation
+    height = db.Column(db.Integer, nullable=True)
+    orientation = db.Column(db.SmallInteger, nullable=True) # EXIF orientation tag
+    taken_at = db.Column(db.Float, nullable=True) # capture time, epoch seconds
+    camera = db.Column(db.String(120), nullable=True)
+    duration = db.Column(db.Float, nullable=True) # seconds, videos only
+    placeholder = db.Column(db.Text, nullable=True) # tiny base64 data: URI, images only
+    meta_version = db.Column(db.Integer, nullable=True) # METADATA_VERSION when extracted
+
+    # Keyset pagination indexes for the sortable listing
+    __table_args__ = (
+        db.Index('ix_media_file_folder_name', 'folder', 'name', 'path'),
+        db.Index('ix_media_file_folder_mtime', 'folder', 'mtime', 'path'),
+        db.Index('ix_media_file_folder_size', 'folder', 'size', 'path'),
+        db.Index('ix_media_file_folder_kind', 'folder', 'kind', 'path'),
+    )
+
+    def __repr__(self):
+        return f"<MediaFile {self.path}>"
+
+class MediaPlacement(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    slot = db.Column(db.String(20), nullable=False) # hero, featured
+    category = db.Column(db.String(255), nullable=False, default='') # '' for hero
+    path = db.Column(db.String(1024), nullable=False, index=True) # MediaFile.path of the original
+    link_path = db.Column(db.String(1024), nullable=True, index=True) # PLACEMENT_MODE=link: MediaFile.path of the link
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('slot', 'category', 'path', name='uq_media_placement'),
+        db.Index('ix_media_placement_slot', 'slot', 'category', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<MediaPlacement {self.slot}:{self.category}:{self.path}>"
+
+# Schema migrations & seeding
+# Run once per deploy through `flask --app server init-db` (or `python server.py`, which
+# does it before starting the dev server), never at import: every gunicorn worker imports
+# this module, and concurrent ALTER TABLEs and seed inserts would race each other.
+def migrate_database():
+    """Creates missing tables, columns and indexes. Call inside an app context."""
     db.create_all()
     # Migration: add columns if they do not exist in sqlite 'user' table
     from sqlalchemy import inspect
@@ -140,12 +890,29 @@ with app.app_context():
             conn.execute(db.text("ALTER TABLE user ADD COLUMN failed_login_attempts INTEGER DEFAULT 0"))
         if 'lockout_until' not in columns:
             conn.execute(db.text("ALTER TABLE user ADD COLUMN lockout_until DATETIME"))
-    
+        media_columns = [col['name'] for col in inspector.get_columns('media_file')]
+        for name, ddl in (
+            ('sha256', 'VARCHAR(64)'), ('width', 'INTEGER'), ('height', 'INTEGER'),
+            ('orientation', 'SMALLINT'), ('taken_at', 'FLOAT'), ('camera', 'VARCHAR(120)'),
+            ('duration', 'FLOAT'), ('placeholder', 'TEXT'), ('meta_version', 'INTEGER'),
+        ):
+            if name not in media_columns:
+                conn.execute(db.text(f"ALTER TABLE media_file ADD COLUMN {name} {ddl}"))
+        placement_columns = [col['name'] for col in inspector.get_columns('media_placement')]
+        if 'link_path' not in placement_columns:
+            conn.execute(db.text("ALTER TABLE media_placement ADD COLUMN link_path VARCHAR(1024)"))
+
+    # Migration: create_all() skips indexes on tables that already exist
+    for model in (MediaFile, MediaPlacement, ActivityLog):
+        for index in model.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+def seed_database():
+    """Ensures the primary admin exists and seeds default club members into an empty table."""
     # Ensure primary admin user exists and has 'admin' role in database
     admin_user = User.query.filter_by(email=ADMIN_EMAIL.lower()).first()
     if not admin_user:
-        hashed_password = bcrypt.generate_password_hash("Admin@123").decode("utf-8")
-        hashed_answer = bcrypt.generate_password_hash("blue").decode("utf-8")
+        hashed_password, hashed_answer = password_hasher.hash("Admin@123", "blue")
         admin_user = User(
             email=ADMIN_EMAIL.lower(),
             password=hashed_password,
@@ -162,11 +929,6 @@ with app.app_context():
         db.session.commit()
         print(f"Startup: Promoted primary admin user ({ADMIN_EMAIL}) to 'admin' role in database.")
 
-    # Create dynamic subfolders inside BASE_PATH
-    os.makedirs(os.path.join(BASE_PATH, 'Members'), exist_ok=True)
-    os.makedirs(os.path.join(BASE_PATH, 'Hero'), exist_ok=True)
-    os.makedirs(os.path.join(BASE_PATH, 'Feature'), exist_ok=True)
-
     # Seed default club members if database is empty
     if ClubMember.query.count() == 0:
         default_members = [
@@ -223,6 +985,1290 @@ def safe_join_base(*parts):
         raise ValueError("Invalid path")
     return candidate
 
+# Media Catalog
+# One MediaFile row per media file under BASE_PATH so listings are indexed queries
+# instead of a full os.walk. Mutating endpoints keep it current; reconcile_catalog()
+# picks up anything changed on disk behind our back.
+def media_kind(filename: str) -> str:
+    return "video" if filename.rsplit('.', 1)[-1].lower() in VIDEO_EXTENSIONS else "image"
+
+def rel_media_path(abs_path: str) -> str:
+    rel = os.path.relpath(abs_path, BASE_PATH).replace('\\', '/')
+    return '' if rel == '.' else rel
+
+def folder_prefix_filter(column, rel_folder: str):
+    # Matches rel_folder and everything below it. Range bounds ('/' < '0') keep the index usable.
+    if not rel_folder:
+        return db.true()
+    return db.or_(column == rel_folder, db.and_(column > rel_folder + '/', column < rel_folder + '0'))
+
+def is_catalogued(rel_path: str) -> bool:
+    parts = rel_path.split('/')
+    return allowed_file(parts[-1]) and not any(p.startswith('.') for p in parts)
+
+def placements_changed(rel, touched=0):
+    # Hero/Feature listings read placements plus any legacy copies under Hero/ and Feature/
+    if touched or rel.split('/', 1)[0] in ('Hero', 'Feature'):
+        placements_cache.bump()
+
+def catalog_upsert(abs_path, sha256=None):
+    try:
+        rel = rel_media_path(abs_path)
+        if not is_catalogued(rel):
+            return
+        st = fs_stat(abs_path)
+        entry = MediaFile.query.filter_by(path=rel).first()
+        if not entry:
+            entry = MediaFile(path=rel)
+            db.session.add(entry)
+        changed = entry.size != st.st_size or entry.mtime != st.st_mtime
+        entry.folder = rel.rpartition('/')[0]
+        entry.name = rel.rpartition('/')[2]
+        entry.size = st.st_size
+        entry.mtime = st.st_mtime
+        entry.kind = media_kind(entry.name)
+        if sha256:
+            entry.sha256 = sha256
+        elif changed:
+            entry.sha256 = None  # stale; the backfill job rehashes it
+        if changed:
+            entry.meta_version = None
+        db.session.commit()
+        placements_changed(rel)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+
+def remove_placement_links(condition):
+    """Deletes the PLACEMENT_MODE=link files of placements matching condition, and their rows.
+
+    Leaves the placement rows and the commit to the caller. Returns the number of links.
+    """
+    link_rels = [row.link_path for row in db.session.query(MediaPlacement.link_path).filter(
+        condition, MediaPlacement.link_path.isnot(None))]
+    for link_rel in link_rels:
+        try:
+            os.remove(safe_join_base(*link_rel.split('/')))
+        except FileNotFoundError:
+            pass
+    for start in range(0, len(link_rels), 500):
+        MediaFile.query.filter(MediaFile.path.in_(link_rels[start:start + 500])).delete(synchronize_session=False)
+    return len(link_rels)
+
+def catalog_remove(abs_path):
+    try:
+        rel = rel_media_path(abs_path)
+        MediaFile.query.filter_by(path=rel).delete(synchronize_session=False)
+        # A deleted original takes its Hero/Feature links with it
+        remove_placement_links(MediaPlacement.path == rel)
+        touched = MediaPlacement.query.filter(
+            db.or_(MediaPlacement.path == rel, MediaPlacement.link_path == rel)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        placements_changed(rel, touched)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+
+def catalog_move(old_abs_path, new_abs_path):
+    # Single-file rename: the row (hash, metadata) and any placements follow the file
+    old_rel = rel_media_path(old_abs_path)
+    new_rel = rel_media_path(new_abs_path)
+    moved = 0
+    try:
+        MediaFile.query.filter_by(path=new_rel).delete(synchronize_session=False)
+        moved = MediaFile.query.filter_by(path=old_rel).update({
+            MediaFile.path: new_rel,
+            MediaFile.folder: new_rel.rpartition('/')[0],
+            MediaFile.name: new_rel.rpartition('/')[2],
+            MediaFile.kind: media_kind(new_rel),
+        }, synchronize_session=False)
+        touched = MediaPlacement.query.filter_by(path=old_rel).update(
+            {MediaPlacement.path: new_rel}, synchronize_session=False)
+        touched += MediaPlacement.query.filter_by(link_path=old_rel).update(
+            {MediaPlacement.link_path: new_rel}, synchronize_session=False)
+        db.session.commit()
+        placements_changed(old_rel, touched)
+        placements_changed(new_rel)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+    if not moved:
+        catalog_upsert(new_abs_path)
+
+def catalog_remove_tree(abs_folder):
+    try:
+        rel = rel_media_path(abs_folder)
+        MediaFile.query.filter(folder_prefix_filter(MediaFile.folder, rel)).delete(synchronize_session=False)
+        remove_placement_links(folder_prefix_filter(MediaPlacement.path, rel))
+        touched = MediaPlacement.query.filter(folder_prefix_filter(MediaPlacement.path, rel)).delete(synchronize_session=False)
+        db.session.commit()
+        placements_changed(rel, touched)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+
+def catalog_move_tree(old_abs_folder, new_abs_folder):
+    old_rel = rel_media_path(old_abs_folder)
+    new_rel = rel_media_path(new_abs_folder)
+    try:
+        MediaFile.query.filter(folder_prefix_filter(MediaFile.folder, old_rel)).update({
+            MediaFile.path: db.literal(new_rel) + db.func.substr(MediaFile.path, len(old_rel) + 1),
+            MediaFile.folder: db.literal(new_rel) + db.func.substr(MediaFile.folder, len(old_rel) + 1),
+        }, synchronize_session=False)
+        touched = MediaPlacement.query.filter(folder_prefix_filter(MediaPlacement.path, old_rel)).update({
+            MediaPlacement.path: db.literal(new_rel) + db.func.substr(MediaPlacement.path, len(old_rel) + 1),
+        }, synchronize_session=False)
+        db.session.commit()
+        placements_changed(old_rel, touched)
+        placements_changed(new_rel)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+
+def catalog_apply_batch(removed=(), moved=(), copied=()):
+    """Applies many file changes in one transaction and bumps caches once.
+
+    removed holds absolute paths, moved and copied hold (source, destination) pairs.
+    Copies reuse the source row's hash and metadata since the bytes are identical.
+    Destinations whose source had no row are upserted afterwards.
+    """
+    missing = []
+    touched = 0
+    rels = []
+    try:
+        removed_rels = [rel_media_path(p) for p in removed]
+        for start in range(0, len(removed_rels), 500):
+            chunk = removed_rels[start:start + 500]
+            MediaFile.query.filter(MediaFile.path.in_(chunk)).delete(synchronize_session=False)
+            remove_placement_links(MediaPlacement.path.in_(chunk))
+            touched += MediaPlacement.query.filter(
+                db.or_(MediaPlacement.path.in_(chunk), MediaPlacement.link_path.in_(chunk))
+            ).delete(synchronize_session=False)
+        rels.extend(removed_rels)
+        for old_abs_path, new_abs_path in moved:
+            old_rel, new_rel = rel_media_path(old_abs_path), rel_media_path(new_abs_path)
+            MediaFile.query.filter_by(path=new_rel).delete(synchronize_session=False)
+            updated = MediaFile.query.filter_by(path=old_rel).update({
+                MediaFile.path: new_rel,
+                MediaFile.folder: new_rel.rpartition('/')[0],
+                MediaFile.name: new_rel.rpartition('/')[2],
+                MediaFile.kind: media_kind(new_rel),
+            }, synchronize_session=False)
+            touched += MediaPlacement.query.filter_by(path=old_rel).update(
+                {MediaPlacement.path: new_rel}, synchronize_session=False)
+            touched += MediaPlacement.query.filter_by(link_path=old_rel).update(
+                {MediaPlacement.link_path: new_rel}, synchronize_session=False)
+            if not updated:
+                missing.append(new_abs_path)
+            rels.extend((old_rel, new_rel))
+        copy_columns = [c.name for c in MediaFile.__table__.columns if c.name not in ('id', 'path', 'folder', 'name', 'size', 'mtime', 'kind')]
+        for src_abs_path, dst_abs_path in copied:
+            src_rel, dst_rel = rel_media_path(src_abs_path), rel_media_path(dst_abs_path)
+            source = MediaFile.query.filter_by(path=src_rel).first()
+            MediaFile.query.filter_by(path=dst_rel).delete(synchronize_session=False)
+            if source is None or not is_catalogued(dst_rel):
+                missing.append(dst_abs_path)
+                continue
+            st = fs_stat(dst_abs_path)
+            db.session.add(MediaFile(
+                path=dst_rel, folder=dst_rel.rpartition('/')[0], name=dst_rel.rpartition('/')[2],
+                kind=media_kind(dst_rel), size=st.st_size, mtime=st.st_mtime, **{name: getattr(source, name) for name in copy_columns},
+            ))
+            rels.append(dst_rel)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Catalog error: {str(e)}")
+        return  # the periodic reconcile repairs the rows
+    if touched or any(rel.split('/', 1)[0] in ('Hero', 'Feature') for rel in rels):
+        placements_cache.bump()
+    for abs_path in missing:
+        catalog_upsert(abs_path)
+    if missing:
+        metadata_backfill.start()
+
+def scan_media_tree(abs_root):
+    # Yields (rel_path, size, mtime) using scandir's cached stat; dot-directories are skipped.
+    stack = [abs_root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(fs_scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif allowed_file(entry.name) and entry.is_file():
+                st = fs_entry_stat(entry)
+                yield rel_media_path(entry.path), st.st_size, st.st_mtime
+
+def bulk_update_media_rows(updates):
+    """Executes [{'id': ..., <column>: ...}] as Core UPDATEs by id.
+
+    Unlike an ORM bulk update by primary key, rows deleted since they were read (a
+    bulk delete or reconcile racing this call) simply match nothing.
+    """
+    table = MediaFile.__table__
+    by_columns = {}
+    for update in updates:
+        by_columns.setdefault(tuple(sorted(k for k in update if k != 'id')), []).append(update)
+    for columns, group in by_columns.items():
+        statement = table.update().where(table.c.id == db.bindparam('_id')).values(
+            {column: db.bindparam(f'_{column}') for column in columns})
+        db.session.execute(statement, [{f'_{key}': value for key, value in update.items()} for update in group])
+
+def reconcile_catalog(abs_root=None):
+    abs_root = abs_root or BASE_PATH
+    rel_root = rel_media_path(abs_root)
+    known = {
+        row.path: (row.id, row.size, row.mtime)
+        for row in db.session.query(MediaFile.id, MediaFile.path, MediaFile.size, MediaFile.mtime)
+        .filter(folder_prefix_filter(MediaFile.folder, rel_root))
+    }
+    added, updated = [], []
+    for rel, size, mtime in scan_media_tree(abs_root):
+        folder, _, name = rel.rpartition('/')
+        current = known.pop(rel, None)
+        if current is None:
+            added.append({'path': rel, 'folder': folder, 'name': name, 'size': size, 'mtime': mtime, 'kind': media_kind(name)})
+        elif current[1] != size or current[2] != mtime:
+            updated.append({'id': current[0], 'size': size, 'mtime': mtime, 'sha256': None, 'meta_version': None})
+    removed_ids = [row_id for row_id, _, _ in known.values()]
+    try:
+        if added:
+            db.session.execute(db.insert(MediaFile), added)
+        if updated:
+            bulk_update_media_rows(updated)
+        for i in range(0, len(removed_ids), 500):
+            MediaFile.query.filter(MediaFile.id.in_(removed_ids[i:i + 500])).delete(synchronize_session=False)
+        # Placements whose original vanished from disk go with it, links included
+        original_missing = ~db.exists().where(MediaFile.path == MediaPlacement.path)
+        remove_placement_links(original_missing)
+        dangling = MediaPlacement.query.filter(original_missing).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if added or updated or removed_ids or dangling:
+        placements_cache.bump()
+    return {'added': len(added), 'updated': len(updated), 'removed': len(removed_ids)}
+
+def catalog_reconcile_loop():
+    while True:
+        time.sleep(CATALOG_RECONCILE_SECONDS)
+        try:
+            with app.app_context():
+                stats = reconcile_catalog()
+            if stats['added'] or stats['updated']:
+                content_hash_backfill.start()
+                metadata_backfill.start()
+        except Exception as e:
+            print(f"Catalog reconcile error: {str(e)}")
+
+# Thumbnail Cache
+# Resized JPEGs (and WebP/AVIF variants, see Image Variants) are rendered in a process pool
+# and stored under THUMB_CACHE_DIR, keyed by the source's path, size and mtime so edits
+# produce a new entry. File mtimes double as LRU timestamps: hits touch them and eviction
+# removes the oldest once over budget.
+_thumb_lock = threading.RLock()
+_thumb_pool = None
+_thumb_jobs = {}
+_thumb_cache_bytes = None
+
+def get_thumb_pool():
+    global _thumb_pool
+    with _thumb_lock:
+        if _thumb_pool is None:
+            _thumb_pool = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+        return _thumb_pool
+
+def thumbnail_cache_path(abs_path, size):
+    st = fs_stat(abs_path)
+    key = hashlib.sha256(f"{rel_media_path(abs_path)}:{st.st_size}:{st.st_mtime_ns}:{size}".encode()).hexdigest()
+    return os.path.join(THUMB_CACHE_DIR, key[:2], f"{key}.jpg")
+
+def evict_thumbnails():
+    entries = []
+    for root, _, files in os.walk(THUMB_CACHE_DIR):
+        for f in files:
+            try:
+                st = os.stat(os.path.join(root, f))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, os.path.join(root, f)))
+    total = sum(size for _, size, _ in entries)
+    if total > THUMB_CACHE_MAX_BYTES:
+        entries.sort()
+        target = THUMB_CACHE_MAX_BYTES * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    return total
+
+def thumbnail_done(cache_path, future):
+    global _thumb_cache_bytes
+    with _thumb_lock:
+        _thumb_jobs.pop(cache_path, None)
+        if future.exception() is not None:
+            print(f"Thumbnail error: {future.exception()}")
+            return
+        if _thumb_cache_bytes is None:
+            _thumb_cache_bytes = evict_thumbnails()
+        else:
+            _thumb_cache_bytes += future.result()
+            if _thumb_cache_bytes > THUMB_CACHE_MAX_BYTES:
+                _thumb_cache_bytes = evict_thumbnails()
+
+def submit_render(cache_path, render, *args):
+    # One job per cache path: concurrent requests for the same output share the future
+    if fs_exists(cache_path):
+        return None
+    with _thumb_lock:
+        future = _thumb_jobs.get(cache_path)
+        if future is None:
+            future = get_thumb_pool().submit(render, *args)
+            _thumb_jobs[cache_path] = future
+            future.add_done_callback(lambda f, key=cache_path: thumbnail_done(key, f))
+    return future
+
+def submit_thumbnail(abs_path, size, fmt=None):
+    if fmt:
+        cache_path = variant_cache_path(abs_path, fmt, size)
+        args = (abs_path, cache_path, size, VARIANT_QUALITY[fmt], fmt.upper())
+    else:
+        cache_path = thumbnail_cache_path(abs_path, size)
+        args = (abs_path, cache_path, size)
+    return cache_path, submit_render(cache_path, media_workers.render_thumbnail, *args)
+
+def await_render(cache_path, future, timeout):
+    # Returns cache_path once it exists, or None if the render failed or is still running
+    try:
+        if future is not None:
+            future.result(timeout=timeout)
+        elif time.time() - os.path.getmtime(cache_path) > 3600:
+            os.utime(cache_path)
+        return cache_path
+    except Exception as e:
+        if timeout:
+            print(f"Thumbnail error: {str(e)}")
+        return None
+
+def get_thumbnail(abs_path, size, fmt=None):
+    if media_workers.Image is None or media_kind(abs_path) != "image":
+        return None
+    try:
+        cache_path, future = submit_thumbnail(abs_path, size, fmt)
+    except Exception as e:
+        print(f"Thumbnail error: {str(e)}")
+        return None
+    return await_render(cache_path, future, THUMB_TIMEOUT)
+
+def prewarm_thumbnails(abs_path):
+    # Queue the grid-size thumbnail at upload time so the first gallery view is a cache hit
+    if media_workers.Image is None or media_kind(abs_path) != "image":
+        return
+    try:
+        submit_thumbnail(abs_path, THUMB_GRID_SIZE)
+        if VARIANT_FORMATS and is_variant_source(abs_path):
+            submit_thumbnail(abs_path, THUMB_GRID_SIZE, VARIANT_FORMATS[0])
+    except Exception as e:
+        print(f"Thumbnail error: {str(e)}")
+
+# Image Variants
+# Browsers that list image/avif or image/webp in Accept get a transcode of JPEG/PNG
+# originals. Variants are keyed by the catalog's content hash when it is current, so
+# duplicate uploads share one, and fall back to path+size+mtime otherwise. Full-size
+# transcodes never block a request: until one is ready the original is sent, without
+# the immutable caching that would pin it in the browser.
+def is_variant_source(abs_path):
+    return bool(VARIANT_FORMATS) and abs_path.rsplit('.', 1)[-1].lower() in VARIANT_SOURCE_EXTENSIONS
+
+def negotiate_image_format(abs_path):
+    """Returns the preferred variant format the client explicitly accepts, or None for the original."""
+    if not is_variant_source(abs_path):
+        return None
+    # Only explicit entries count: "*/*" clients (curl, download managers) keep the original
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    for fmt in VARIANT_FORMATS:
+        if VARIANT_MIMETYPES[fmt] in accepted:
+            return fmt
+    return None
+
+def variant_cache_path(abs_path, fmt, size=None, st=None):
+    st = st or fs_stat(abs_path)
+    rel = rel_media_path(abs_path)
+    row = db.session.query(MediaFile.sha256, MediaFile.size, MediaFile.mtime).filter_by(path=rel).first()
+    if row and row.sha256 and row.size == st.st_size and row.mtime == st.st_mtime:
+        source_key = row.sha256
+    else:
+        source_key = f"{rel}:{st.st_size}:{st.st_mtime_ns}"
+    key = hashlib.sha256(f"{source_key}:{fmt}:{VARIANT_QUALITY[fmt]}:{size or 'full'}".encode()).hexdigest()
+    return os.path.join(THUMB_CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+def get_image_variant(abs_path, fmt, st=None):
+    try:
+        cache_path = variant_cache_path(abs_path, fmt, st=st)
+        future = submit_render(cache_path, media_workers.render_variant, abs_path, cache_path, fmt.upper(), VARIANT_QUALITY[fmt])
+    except Exception as e:
+        print(f"Variant error: {str(e)}")
+        return None
+    return await_render(cache_path, future, 0) if future is None or future.done() else None
+
+# Listing Pagination
+# Cursors are opaque base64 JSON holding the last row's sort value and tie-breaker, so
+# every page is a keyset query and page N costs the same as page 1. Decoded values are
+# checked against the types the current sort produces, since a cursor is client input.
+LISTING_DEFAULT_LIMIT = 100
+LISTING_MAX_LIMIT = 500
+CURSOR_NUMBER = (int, float)
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, types):
+    # types holds the expected type (or tuple of types) of each value, in order
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return values
+
+def parse_listing_args(sort_fields):
+    # sort_fields maps each sort name to the type of its sort value; cursors pair that value
+    # with a string tie-breaker. Returns (sort, descending, limit, cursor_values); limit is
+    # None for an unpaginated listing
+    sort = request.args.get('sort', 'name')
+    if sort not in sort_fields:
+        raise ValueError(f"sort must be one of {', '.join(sort_fields)}")
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    if limit is None and cursor is None:
+        return sort, order == 'desc', None, None
+    try:
+        limit = int(limit) if limit is not None else LISTING_DEFAULT_LIMIT
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, LISTING_MAX_LIMIT))
+    return sort, order == 'desc', limit, decode_cursor(cursor, (sort_fields[sort], str)) if cursor else None
+
+def list_subfolder_page(folder_path):
+    # Returns (names, next_cursor) for the directories directly inside folder_path
+    sort, descending, limit, after = parse_listing_args({'name': str, 'mtime': CURSOR_NUMBER})
+    entries = []
+    with fs_scandir(folder_path) as it:
+        for entry in it:
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            key = fs_entry_stat(entry).st_mtime if sort == 'mtime' else entry.name
+            entries.append((key, entry.name))
+    entries.sort(reverse=descending)
+    if after is not None:
+        after = tuple(after)
+        entries = [e for e in entries if (e < after if descending else e > after)]
+    if limit is None or len(entries) <= limit:
+        return [name for _, name in entries], None
+    page = entries[:limit]
+    return [name for _, name in page], encode_cursor(list(page[-1]))
+
+def serialize_media_rows(rows, base_url):
+    # rows carry media_row_columns() from MediaFile
+    images = []
+    encoded_folders = {}
+    for row in rows:
+        encoded_rel_folder = encoded_folders.get(row.folder)
+        if encoded_rel_folder is None:
+            encoded_rel_folder = '/'.join(secure_filename(p) for p in row.folder.split('/') if p)
+            encoded_folders[row.folder] = encoded_rel_folder
+        filename = secure_filename(row.name)
+        version = media_version(row.size, row.mtime)
+
+        if encoded_rel_folder:
+            image_url = f"{base_url}/api/image/{encoded_rel_folder}/{filename}?v={version}"
+            download_url = f"{base_url}/api/download/{encoded_rel_folder}/{filename}"
+            thumb_url = f"{base_url}/api/thumb/{THUMB_GRID_SIZE}/{encoded_rel_folder}/{filename}?v={version}"
+        else:
+            image_url = f"{base_url}/api/image/{filename}?v={version}"
+            download_url = f"{base_url}/api/download/{filename}"
+            thumb_url = f"{base_url}/api/thumb/{THUMB_GRID_SIZE}/{filename}?v={version}"
+
+        images.append({
+            'id': filename,
+            'name': filename,
+            'url': image_url,
+            'thumbnail': thumb_url if row.kind == 'image' else image_url,
+            'download': download_url,
+            'kind': row.kind,
+            **serialize_media_metadata(row),
+        })
+    return images
+
+# Folder Tree
+# Aggregates for each directory (its own media count, bytes, newest mtime, cover image and
+# subfolder names) are cached under the directory's st_mtime_ns. Every writer here ends in
+# os.replace, os.rename or os.remove, and each of those bumps the parent directory's
+# mtime, so revalidating a folder costs one stat instead of a listdir plus a stat per
+# entry. This also holds across worker processes. Subtree totals are summed from the
+# cached folders on every call.
+class FolderTreeCache:
+    # Directories modified this recently are not cached: coarse filesystem timestamps could
+    # hide a second change made within the same tick
+    SETTLE_SECONDS = 2
+
+    def __init__(self, max_folders):
+        self.max_folders = max_folders
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def folder(self, abs_path):
+        st = fs_stat(abs_path)
+        with self._lock:
+            entry = self._entries.get(abs_path)
+            if entry is not None and entry['mtime_ns'] == st.st_mtime_ns:
+                self._entries.move_to_end(abs_path)
+                self.stats['hits'] += 1
+                return entry
+            self.stats['misses'] += 1
+        entry = self._scan(abs_path, st.st_mtime_ns)
+        if time.time() - st.st_mtime > self.SETTLE_SECONDS:
+            with self._lock:
+                self._entries[abs_path] = entry
+                self._entries.move_to_end(abs_path)
+                while len(self._entries) > self.max_folders:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def _scan(self, abs_path, mtime_ns):
+        entry = {'mtime_ns': mtime_ns, 'subfolders': [], 'files': 0, 'bytes': 0, 'newest': None, 'cover': None}
+        cover_mtime = None
+        with fs_scandir(abs_path) as it:
+            for item in it:
+                if item.name.startswith('.'):
+                    continue
+                if item.is_dir(follow_symlinks=False):
+                    entry['subfolders'].append(item.name)
+                    continue
+                if not allowed_file(item.name) or not item.is_file():
+                    continue
+                st = fs_entry_stat(item)
+                entry['files'] += 1
+                entry['bytes'] += st.st_size
+                entry['newest'] = max(entry['newest'] or 0, st.st_mtime)
+                # Cover: the folder's newest image
+                if media_kind(item.name) == 'image' and (cover_mtime is None or st.st_mtime > cover_mtime):
+                    entry['cover'], cover_mtime = item.name, st.st_mtime
+        entry['subfolders'].sort(key=str.lower)
+        return entry
+
+    def build(self, abs_path, depth):
+        """Returns the node for abs_path with subtree totals and children down to depth levels.
+
+        A folder without images of its own takes the cover of its first subfolder that has one.
+        """
+        entry = self.folder(abs_path)
+        rel = rel_media_path(abs_path)
+        node = {
+            'name': rel.rpartition('/')[2],
+            'path': rel,
+            'fileCount': entry['files'],
+            'totalBytes': entry['bytes'],
+            'newestMtime': entry['newest'],
+            'subfolderCount': len(entry['subfolders']),
+            'cover': f"{rel}/{entry['cover']}".lstrip('/') if entry['cover'] else None,
+        }
+        children = []
+        for name in entry['subfolders']:
+            try:
+                child = self.build(os.path.join(abs_path, name), depth - 1)
+            except OSError:
+                continue  # removed while we walked
+            node['fileCount'] += child['fileCount']
+            node['totalBytes'] += child['totalBytes']
+            if child['newestMtime'] and child['newestMtime'] > (node['newestMtime'] or 0):
+                node['newestMtime'] = child['newestMtime']
+            if node['cover'] is None:
+                node['cover'] = child['cover']
+            children.append(child)
+        if depth > 0:
+            node['children'] = children
+        return node
+
+folder_tree_cache = FolderTreeCache(TREE_CACHE_MAX_FOLDERS)
+
+def attach_tree_covers(root, base_url):
+    # Swaps each node's cover path for the catalog's serialized media entry in one query per 500 covers
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get('children', ()))
+    paths = list({node['cover'] for node in nodes if node['cover']})
+    covers = {}
+    for start in range(0, len(paths), 500):
+        rows = db.session.query(*media_row_columns()).filter(MediaFile.path.in_(paths[start:start + 500])).all()
+        covers.update(zip((row.path for row in rows), serialize_media_rows(rows, base_url)))
+    for node in nodes:
+        node['cover'] = covers.get(node['cover'])
+
+# Media Placements
+# Hero and Featured slots are MediaPlacement rows pointing at the original's catalog path,
+# so placing a photo is one INSERT and renames/deletes carry over through the catalog
+# helpers. Files copied into Hero/ and Feature/<category>/ by older versions (or linked
+# there in PLACEMENT_MODE=link) are still listed alongside the references. A link's row
+# records where the link went, so it is listed once and removed by that path.
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def placement_dir(slot, category=''):
+    if slot == 'hero':
+        return os.path.join(BASE_PATH, 'Hero')
+    return os.path.join(BASE_PATH, 'Feature', category)
+
+def placement_link_path(slot, category, rel):
+    # Originals from different folders can share a basename; a short hash of the original's
+    # path keeps their links apart, and re-placing the same original lands on the same name
+    stem, ext = os.path.splitext(rel.rpartition('/')[2])
+    digest = hashlib.sha256(rel.encode()).hexdigest()[:10]
+    return os.path.join(placement_dir(slot, category), f"{stem}-{digest}{ext}")
+
+def link_media_file(src_path, dest_path):
+    """Hardlink, else reflink, src_path to dest_path. Returns False when neither is possible."""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    if os.path.exists(dest_path) and os.path.samefile(src_path, dest_path):
+        return True  # already linked; rename() onto the same inode would leave the tmp link behind
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src_path, tmp_path)
+    except OSError:
+        if fcntl is None:
+            return False
+        try:
+            with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dest:
+                fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+    os.replace(tmp_path, dest_path)
+    return True
+
+def media_row_columns():
+    return (
+        MediaFile.path, MediaFile.folder, MediaFile.name, MediaFile.kind, MediaFile.size, MediaFile.mtime,
+        MediaFile.width, MediaFile.height, MediaFile.orientation, MediaFile.taken_at, MediaFile.camera, MediaFile.duration,
+        MediaFile.placeholder,
+    )
+
+def placement_rows(slot, category=''):
+    legacy_folder = rel_media_path(placement_dir(slot, category))
+    legacy = db.session.query(*media_row_columns()).filter(
+        folder_prefix_filter(MediaFile.folder, legacy_folder)
+    ).order_by(MediaFile.folder, MediaFile.name).all()
+    placed = db.session.query(*media_row_columns(), MediaPlacement.link_path).join(
+        MediaPlacement, MediaPlacement.path == MediaFile.path
+    ).filter(
+        MediaPlacement.slot == slot, MediaPlacement.category == category
+    ).order_by(MediaPlacement.created_at, MediaPlacement.id).all()
+    legacy_paths = {row.path for row in legacy}
+    # A linked placement is listed through its link, which sits in the legacy folder
+    return legacy + [row for row in placed if row.path not in legacy_paths and row.link_path not in legacy_paths]
+
+def featured_categories():
+    placed = db.session.query(MediaPlacement.category).join(
+        MediaFile, MediaFile.path == MediaPlacement.path
+    ).filter(MediaPlacement.slot == 'featured').distinct()
+    legacy = db.session.query(MediaFile.folder).filter(folder_prefix_filter(MediaFile.folder, 'Feature')).distinct()
+    categories = {row.category for row in placed}
+    categories.update(row.folder.split('/')[1] for row in legacy if row.folder.count('/') >= 1)
+    return sorted(categories)
+
+# Upload Sessions
+# A session preallocates one data file and writes every chunk straight to its offset,
+# tracking arrivals in a one-byte-per-chunk bitmap (pwrite is atomic per byte, so
+# concurrent workers never need a lock). Completion is a single os.replace into place.
+UPLOAD_SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+UPLOAD_COPY_BUFFER = 1024 * 1024
+
+# session id -> [sha256 object, next offset]. Chunks that arrive in order are hashed as
+# they are written; whatever is left past the frontier is read back once at completion.
+_upload_hashers = {}
+_upload_hashers_lock = threading.Lock()
+
+def upload_session_dir(session_id):
+    if not UPLOAD_SESSION_ID_RE.match(session_id or ''):
+        raise ValueError("Invalid upload session id")
+    return os.path.join(UPLOAD_SESSIONS_DIR, session_id)
+
+def save_upload_session(meta):
+    session_dir = upload_session_dir(meta['id'])
+    tmp_path = os.path.join(session_dir, f"meta.json.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(session_dir, 'meta.json'))
+
+def load_upload_session(session_id):
+    try:
+        with open(os.path.join(upload_session_dir(session_id), 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def check_upload_geometry(total_chunks, chunk_size, file_size=None):
+    """Raises ValueError unless the session's size, chunk size and chunk count are within bounds."""
+    if file_size is not None and not 0 <= file_size <= UPLOAD_MAX_FILE_SIZE:
+        raise ValueError(f"fileSize must be between 0 and {UPLOAD_MAX_FILE_SIZE} bytes")
+    if not 1 <= total_chunks <= UPLOAD_MAX_CHUNKS:
+        raise ValueError(f"totalChunks must be between 1 and {UPLOAD_MAX_CHUNKS}")
+    if not 0 < chunk_size <= app.config["MAX_CONTENT_LENGTH"]:
+        raise ValueError(f"chunkSize must be between 1 and {app.config['MAX_CONTENT_LENGTH']} bytes")
+    if total_chunks > 1 and chunk_size < UPLOAD_MIN_CHUNK_SIZE:
+        raise ValueError(f"chunkSize must be at least {UPLOAD_MIN_CHUNK_SIZE} bytes for multi-chunk uploads")
+    if file_size is not None and total_chunks != max(1, -(-file_size // chunk_size)):
+        raise ValueError("totalChunks does not match fileSize and chunkSize")
+
+def create_upload_session(session_id, user_id, folder_id, filename, total_chunks, chunk_size, file_size=None):
+    check_upload_geometry(total_chunks, chunk_size, file_size)
+    session_dir = upload_session_dir(session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    with open(os.path.join(session_dir, 'data'), 'wb') as f:
+        if file_size:
+            f.truncate(file_size)
+    with open(os.path.join(session_dir, 'bitmap'), 'wb') as f:
+        f.write(b'\0' * total_chunks)
+    meta = {
+        'id': session_id,
+        'userId': user_id,
+        'folderId': folder_id,
+        'filename': filename,
+        'fileSize': file_size,
+        'chunkSize': chunk_size,
+        'totalChunks': total_chunks,
+        'createdAt': time.time(),
+    }
+    save_upload_session(meta)
+    return meta
+
+def read_upload_bitmap(meta):
+    with open(os.path.join(upload_session_dir(meta['id']), 'bitmap'), 'rb') as f:
+        return f.read()
+
+def write_upload_chunk(meta, index, stream):
+    """Copies one chunk from `stream` to its offset; returns the number of bytes written."""
+    total, chunk_size, file_size = meta['totalChunks'], meta['chunkSize'], meta['fileSize']
+    if not 0 <= index < total:
+        raise ValueError(f"chunkIndex must be between 0 and {total - 1}")
+    is_last = index == total - 1
+    if file_size is not None:
+        expected = min(chunk_size, file_size - index * chunk_size)
+    else:
+        expected = None if is_last else chunk_size
+    limit = expected if expected is not None else chunk_size
+
+    session_dir = upload_session_dir(meta['id'])
+    offset = index * chunk_size
+    written = 0
+    with _upload_hashers_lock:
+        hash_state = _upload_hashers.pop(meta['id'], None)
+    if hash_state is None and offset == 0:
+        hash_state = [hashlib.sha256(), 0]
+    hasher = hash_state[0] if hash_state and hash_state[1] == offset else None
+    if hash_state and hasher is None:
+        # Not the next chunk in sequence (or a retry); leave the frontier where it was
+        with _upload_hashers_lock:
+            _upload_hashers.setdefault(meta['id'], hash_state)
+    with open(os.path.join(session_dir, 'data'), 'r+b') as f:
+        f.seek(offset)
+        while True:
+            block = stream.read(UPLOAD_COPY_BUFFER)
+            if not block:
+                break
+            written += len(block)
+            if written > limit:
+                raise ValueError(f"Chunk {index} is larger than {limit} bytes")
+            f.write(block)
+            if hasher:
+                hasher.update(block)
+        if expected is None:
+            # Legacy clients don't send fileSize; the last chunk tells us where the file ends
+            f.truncate(offset + written)
+    if expected is not None and written != expected:
+        raise ValueError(f"Chunk {index} has {written} bytes, expected {expected}")
+    if expected is None:
+        meta['fileSize'] = offset + written
+        save_upload_session(meta)
+
+    if hasher:
+        hash_state[1] = offset + written
+        with _upload_hashers_lock:
+            _upload_hashers.setdefault(meta['id'], hash_state)
+
+    fd = os.open(os.path.join(session_dir, 'bitmap'), os.O_WRONLY)
+    try:
+        os.pwrite(fd, b'\1', index)
+    finally:
+        os.close(fd)
+    return written
+
+def upload_session_digest(meta):
+    with _upload_hashers_lock:
+        hash_state = _upload_hashers.pop(meta['id'], None)
+    hasher, offset = hash_state if hash_state else (hashlib.sha256(), 0)
+    with open(os.path.join(upload_session_dir(meta['id']), 'data'), 'rb') as f:
+        f.seek(offset)
+        while True:
+            block = f.read(UPLOAD_COPY_BUFFER)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def finish_upload_session(meta):
+    """Atomically moves the assembled file into its folder; returns (final path, SHA-256)."""
+    missing = read_upload_bitmap(meta).count(b'\0')
+    if missing:
+        raise ValueError(f"{missing} chunk(s) still missing")
+    target_folder = safe_join_base(*normalize_parts_from_path(meta['folderId']))
+    final_file_path = os.path.join(target_folder, meta['filename'])
+    session_dir = upload_session_dir(meta['id'])
+    sha256 = upload_session_digest(meta)
+    os.replace(os.path.join(session_dir, 'data'), final_file_path)
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return final_file_path, sha256
+
+def cleanup_upload_sessions():
+    cutoff = time.time() - UPLOAD_SESSION_TTL_HOURS * 3600
+    try:
+        entries = list(os.scandir(UPLOAD_SESSIONS_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+    with _upload_hashers_lock:
+        for session_id in list(_upload_hashers):
+            if not os.path.isdir(os.path.join(UPLOAD_SESSIONS_DIR, session_id)):
+                del _upload_hashers[session_id]
+
+def upload_session_status(meta):
+    bitmap = read_upload_bitmap(meta)
+    return {
+        'sessionId': meta['id'],
+        'folderId': meta['folderId'],
+        'filename': meta['filename'],
+        'fileSize': meta['fileSize'],
+        'chunkSize': meta['chunkSize'],
+        'totalChunks': meta['totalChunks'],
+        'receivedChunks': len(bitmap) - bitmap.count(b'\0'),
+        'missingChunks': bitmap.count(b'\0'),
+        'missingRanges': missing_chunk_ranges(bitmap),
+    }
+
+def missing_chunk_ranges(bitmap):
+    # Inclusive [first, last] index pairs; at most totalChunks / 2 of them
+    ranges = []
+    index = bitmap.find(b'\0')
+    while index != -1:
+        end = bitmap.find(b'\1', index)
+        end = len(bitmap) if end == -1 else end
+        ranges.append([index, end - 1])
+        index = bitmap.find(b'\0', end)
+    return ranges
+
+# Content Hashing
+# Uploads are hashed on the way to disk and the digest lands in MediaFile.sha256. With
+# DEDUP_MODE=hardlink an upload identical to a catalogued file becomes a hardlink to it.
+# Every writer replaces files via os.replace, so a linked copy is never modified in place.
+def save_upload_stream(stream, dest_path):
+    """Streams an upload to dest_path through a temp file; returns its SHA-256 hex digest."""
+    hasher = hashlib.sha256()
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                block = stream.read(UPLOAD_COPY_BUFFER)
+                if not block:
+                    break
+                hasher.update(block)
+                f.write(block)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return hasher.hexdigest()
+
+def hash_file(abs_path):
+    hasher = hashlib.sha256()
+    with open(abs_path, 'rb') as f:
+        while True:
+            block = f.read(UPLOAD_COPY_BUFFER)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def dedupe_media_file(abs_path, sha256):
+    """Replaces abs_path with a hardlink to an identical catalogued file; returns bytes reclaimed."""
+    rel = rel_media_path(abs_path)
+    st = fs_stat(abs_path)
+    candidates = MediaFile.query.filter(
+        MediaFile.sha256 == sha256, MediaFile.size == st.st_size, MediaFile.path != rel
+    ).limit(5).all()
+    for candidate in candidates:
+        existing_path = os.path.join(BASE_PATH, candidate.path)
+        try:
+            est = fs_stat(existing_path)
+        except OSError:
+            continue
+        # The catalog hash is only trustworthy while size and mtime still match
+        if est.st_size != candidate.size or est.st_mtime != candidate.mtime or est.st_dev != st.st_dev:
+            continue
+        if est.st_ino == st.st_ino:
+            return 0
+        tmp_path = f"{abs_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(existing_path, tmp_path)
+        except OSError:
+            continue
+        os.replace(tmp_path, abs_path)
+        return st.st_size
+    return 0
+
+def ingest_media_file(abs_path, sha256):
+    """Catalogs a freshly written upload with its hash (deduplicating it first if enabled) and queues metadata."""
+    if DEDUP_MODE == "hardlink":
+        try:
+            reclaimed = dedupe_media_file(abs_path, sha256)
+            if reclaimed:
+                print(f"Dedup: {rel_media_path(abs_path)} linked to an identical file ({reclaimed} bytes saved)")
+        except Exception as e:
+            print(f"Dedup error: {str(e)}")
+    catalog_upsert(abs_path, sha256=sha256)
+    metadata_backfill.start()
+
+class CatalogBackfill:
+    """Fills in a derived MediaFile field for every row that still lacks it.
+
+    Runs on a daemon thread in batches of BATCH_SIZE rows ordered by id. Calling
+    start() while a run is in progress schedules one more pass afterwards, so rows
+    catalogued mid-run are never missed. Subclasses override the pending() and
+    process() hooks; the defaults select nothing.
+    """
+
+    BATCH_SIZE = 200
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rerun = False
+        self.stats = {'running': False, 'processed': 0, 'skipped': 0, 'failed': 0, 'bytes': 0,
+                      'startedAt': None, 'finishedAt': None}
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                self._rerun = True
+                return False
+            self.stats.update(running=True, processed=0, skipped=0, failed=0, bytes=0,
+                              startedAt=datetime.utcnow().isoformat(), finishedAt=None)
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+            return True
+
+    def join(self, timeout=None):
+        """Waits for the current run, and any pass it scheduled, to finish."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def count(self, outcome, size=0):
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats['bytes'] += size
+
+    def make_pool(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=type(self).__name__)
+
+    def pending(self):
+        """SQL filter for rows that still need processing."""
+        return db.false()
+
+    def process(self, pool, rows):
+        """Returns a list of {'id': ..., <column>: ...} updates for the batch."""
+        return []
+
+    def committed(self, updates):
+        """Called after a batch of updates is committed."""
+
+    def run(self):
+        try:
+            with app.app_context(), self.make_pool() as pool:
+                while True:
+                    with self._lock:
+                        self._rerun = False
+                    last_id = 0
+                    while True:
+                        rows = db.session.query(
+                            MediaFile.id, MediaFile.path, MediaFile.size, MediaFile.mtime, MediaFile.kind
+                        ).filter(self.pending(), MediaFile.id > last_id).order_by(MediaFile.id).limit(self.BATCH_SIZE).all()
+                        if not rows:
+                            break
+                        last_id = rows[-1].id
+                        updates = self.process(pool, rows)
+                        if updates:
+                            bulk_update_media_rows(updates)
+                            db.session.commit()
+                            self.committed(updates)
+                    with self._lock:
+                        if not self._rerun:
+                            break
+        except Exception as e:
+            print(f"{type(self).__name__} error: {str(e)}")
+        finally:
+            self.stats.update(running=False, finishedAt=datetime.utcnow().isoformat())
+
+def catalog_row_current(row, abs_path):
+    # A row whose file changed since it was catalogued is left for the next reconcile
+    try:
+        st = fs_stat(abs_path)
+    except OSError:
+        return False
+    return st.st_size == row.size and st.st_mtime == row.mtime
+
+class ContentHashBackfill(CatalogBackfill):
+    """Hashes catalogued files whose sha256 is still NULL.
+
+    hashlib releases the GIL on large buffers, so a thread pool reads and hashes
+    HASH_WORKERS files in parallel.
+    """
+
+    def pending(self):
+        return MediaFile.sha256.is_(None)
+
+    def process(self, pool, rows):
+        return [u for u in pool.map(self.hash_row, rows) if u]
+
+    def hash_row(self, row):
+        abs_path = os.path.join(BASE_PATH, row.path)
+        if not catalog_row_current(row, abs_path):
+            self.count('skipped')
+            return None
+        try:
+            sha256 = hash_file(abs_path)
+        except OSError:
+            self.count('failed')
+            return None
+        if not catalog_row_current(row, abs_path):
+            self.count('skipped')
+            return None
+        self.count('processed', row.size)
+        return {'id': row.id, 'sha256': sha256}
+
+content_hash_backfill = ContentHashBackfill(HASH_WORKERS)
+
+def duplicate_report(limit, min_size=0):
+    dup_count = db.func.count(MediaFile.id)
+    groups_query = db.session.query(
+        MediaFile.sha256, db.func.max(MediaFile.size).label('size'), dup_count.label('copies')
+    ).filter(MediaFile.sha256.isnot(None), MediaFile.size >= min_size).group_by(MediaFile.sha256).having(dup_count > 1)
+    groups_sub = groups_query.subquery()
+    totals = db.session.query(
+        db.func.count(), db.func.coalesce(db.func.sum(groups_sub.c.size * (groups_sub.c.copies - 1)), 0)
+    ).one()
+    groups = groups_query.order_by((db.func.max(MediaFile.size) * (dup_count - 1)).desc()).limit(limit).all()
+
+    paths_by_hash = {}
+    if groups:
+        for row in db.session.query(MediaFile.sha256, MediaFile.path).filter(
+            MediaFile.sha256.in_([group.sha256 for group in groups])
+        ).order_by(MediaFile.path):
+            paths_by_hash.setdefault(row.sha256, []).append(row.path)
+
+    sets = []
+    for group in groups:
+        paths = paths_by_hash.get(group.sha256, [])
+        inodes = set()
+        for rel in paths:
+            try:
+                st = fs_stat(os.path.join(BASE_PATH, rel))
+                inodes.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+        # Copies already hardlinked together share an inode and cost nothing extra
+        sets.append({
+            'sha256': group.sha256,
+            'size': group.size,
+            'copies': len(paths),
+            'storedCopies': len(inodes),
+            'reclaimableBytes': group.size * max(len(inodes) - 1, 0),
+            'paths': paths,
+        })
+    return {
+        'sets': sets,
+        'totalSets': totals[0],
+        'maxReclaimableBytes': int(totals[1]),
+        'reclaimableBytes': sum(item['reclaimableBytes'] for item in sets),
+        'unhashedFiles': MediaFile.query.filter(MediaFile.sha256.is_(None)).count(),
+    }
+
+# Media Metadata
+# Width/height, orientation, capture time, camera and duration come from file headers
+# (media_workers.extract_metadata) in a process pool. The same pass stores a
+# PLACEHOLDER_SIZE px blur-up placeholder for images, decoding JPEGs at 1/8 scale, so
+# listings can paint something before any thumbnail request. Rows with meta_version !=
+# METADATA_VERSION are (re)extracted; uploads kick the job and so does a reconcile that
+# finds changes.
+class MetadataBackfill(CatalogBackfill):
+    """Extracts header metadata for catalogued files in a METADATA_WORKERS process pool."""
+
+    def make_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def pending(self):
+        return db.or_(MediaFile.meta_version.is_(None), MediaFile.meta_version != METADATA_VERSION)
+
+    def process(self, pool, rows):
+        current = [row for row in rows if catalog_row_current(row, os.path.join(BASE_PATH, row.path))]
+        for _ in range(len(rows) - len(current)):
+            self.count('skipped')
+        futures = [
+            (row, pool.submit(media_workers.extract_metadata, os.path.join(BASE_PATH, row.path), row.kind, PLACEHOLDER_SIZE))
+            for row in current
+        ]
+        updates = []
+        for row, future in futures:
+            try:
+                meta = future.result(timeout=THUMB_TIMEOUT)
+            except Exception:
+                self.count('failed')
+                continue
+            self.count('processed', row.size)
+            updates.append({'id': row.id, 'meta_version': METADATA_VERSION, **meta})
+        return updates
+
+    def committed(self, updates):
+        # Hero/Featured bodies embed metadata and placeholders
+        placements_cache.bump()
+
+metadata_backfill = MetadataBackfill(METADATA_WORKERS)
+
+def serialize_media_metadata(row):
+    return {
+        'width': row.width,
+        'height': row.height,
+        'orientation': row.orientation,
+        'takenAt': datetime.utcfromtimestamp(row.taken_at).strftime('%Y-%m-%dT%H:%M:%SZ') if row.taken_at else None,
+        'camera': row.camera,
+        'duration': row.duration,
+        'placeholder': row.placeholder,
+    }
+
+# Media Caching
+# ETags come from stat (or catalog) size+mtime, so validating a request never reads the
+# file. Listing URLs carry the same fingerprint as ?v=, and a request whose ?v= matches
+# the file on disk is safe to cache forever because any change produces a new URL.
+def media_version(size, mtime):
+    return hashlib.sha256(f"{size}:{mtime!r}".encode()).hexdigest()[:16]
+
+def apply_media_cache_headers(response, url_version):
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    if request.args.get('v') == url_version:
+        response.cache_control.max_age = MEDIA_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = MEDIA_MAX_AGE
+    return response
+
+def media_not_modified(etag, url_version):
+    # Answers a matching If-None-Match before any file is opened (or thumbnail generated)
+    if request.if_none_match.contains(etag):
+        return apply_media_cache_headers(Response(status=304, headers={'ETag': f'"{etag}"'}), url_version)
+    return None
+
+def cap_open_video_range(file_path):
+    rng = request.range
+    if not VIDEO_RANGE_CAP or rng is None or rng.units != 'bytes' or len(rng.ranges) != 1:
+        return
+    start, stop = rng.ranges[0]
+    if stop is None and start >= 0 and media_kind(file_path) == 'video':
+        # send_file re-parses HTTP_RANGE from the environ; the 206 tells the player where we stopped
+        request.environ['HTTP_RANGE'] = f"bytes={start}-{start + VIDEO_RANGE_CAP - 1}"
+
+def offload_media_response(file_path, mimetype, as_attachment=False):
+    # Flask has already done the auth and path checks; the web server streams the bytes
+    # (including Range and conditional handling) with sendfile.
+    response = Response(mimetype=mimetype)
+    if MEDIA_OFFLOAD == 'x-accel':
+        response.headers['X-Accel-Redirect'] = f"{MEDIA_OFFLOAD_PREFIX}/{quote(rel_media_path(file_path))}"
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(file_path)
+    if as_attachment:
+        response.headers['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
+    return response
+
+def send_media_file(file_path, mimetype=None, etag=None, url_version=None, st=None, as_attachment=False):
+    st = st or fs_stat(file_path)
+    version = media_version(st.st_size, st.st_mtime)
+    if mimetype is None:
+        mimetype = guess_type(file_path)[0] or 'application/octet-stream'
+    if MEDIA_OFFLOAD:
+        response = offload_media_response(file_path, mimetype, as_attachment)
+    else:
+        if not as_attachment:
+            cap_open_video_range(file_path)
+        response = send_file(
+            file_path, mimetype=mimetype, conditional=True, etag=etag or version,
+            last_modified=st.st_mtime, as_attachment=as_attachment
+        )
+    if as_attachment:
+        # Downloads sit behind a JWT, so they keep send_file's no-cache default
+        return response
+    return apply_media_cache_headers(response, url_version or version)
+
+def send_inline_image(file_path):
+    """Serves an original inline, or its WebP/AVIF variant when the client asks for one."""
+    if not is_variant_source(file_path):
+        return send_media_file(file_path)
+    fmt = negotiate_image_format(file_path)
+    if fmt is None:
+        response = send_media_file(file_path)
+    else:
+        st = fs_stat(file_path)
+        version = media_version(st.st_size, st.st_mtime)
+        etag = f"{version}-{fmt}"
+        response = media_not_modified(etag, version)
+        if response is None:
+            variant_path = get_image_variant(file_path, fmt, st=st)
+            if variant_path:
+                response = send_media_file(variant_path, mimetype=VARIANT_MIMETYPES[fmt], etag=etag, url_version=version)
+            else:
+                response = send_media_file(file_path, st=st)
+                response.cache_control.immutable = None
+                response.cache_control.max_age = 0
+    response.vary.add('Accept')
+    return response
+
 def make_identity(user):
     is_admin = (user.email.lower() == ADMIN_EMAIL.lower() or user.role == 'admin')
     role = "admin" if is_admin else user.role
@@ -233,20 +2279,335 @@ def create_token_for_user(user):
     access_token = create_access_token(identity=json.dumps(identity))
     return access_token, identity
 
+class CachedUser:
+    """Detached copy of the identity columns make_identity() reads.
+
+    Credentials, security answers and lockout state are deliberately left out: a
+    password reset or lockout recorded by another worker must take effect at once,
+    so login and reset always read those from the database row.
+    """
+
+    __slots__ = ('id', 'email', 'role')
+
+    def __init__(self, user):
+        for field in self.__slots__:
+            setattr(self, field, getattr(user, field))
+
+class UserCache:
+    """TTL + LRU cache of CachedUser snapshots, addressable by id or email.
+
+    Only hits are cached, so a fresh registration is visible immediately. Code
+    that writes a cached column (email, role) must call invalidate(); the TTL
+    covers writes made by other worker processes.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> (expires_at, CachedUser)
+        self._ids_by_email = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, user_id=None, email=None):
+        now = time.monotonic()
+        with self._lock:
+            if user_id is None:
+                user_id = self._ids_by_email.get(email)
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, user):
+        snapshot = CachedUser(user)
+        with self._lock:
+            self._drop(snapshot.id)
+            self._entries[snapshot.id] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._ids_by_email[snapshot.email] = snapshot.id
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_email.clear()
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry and self._ids_by_email.get(entry[1].email) == user_id:
+            del self._ids_by_email[entry[1].email]
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+def get_cached_user(user_id=None, email=None):
+    """Return a CachedUser for the id or email, hitting the database only on a miss."""
+    if user_id is None and not email:
+        return None
+    if USER_CACHE_TTL_SECONDS <= 0:
+        user = db.session.get(User, user_id) if user_id is not None else User.query.filter_by(email=email).first()
+        return CachedUser(user) if user else None
+    cached = user_cache.get(user_id=user_id, email=email)
+    if cached:
+        return cached
+    user = db.session.get(User, user_id) if user_id is not None else User.query.filter_by(email=email).first()
+    return user_cache.put(user) if user else None
+
+class VersionedResponseCache:
+    """Serialized JSON bodies cached under a version counter.
+
+    Writers call bump() after committing; the next read rebuilds the body and
+    its ETag. A build that raced with a bump is returned but not stored.
+    """
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def get(self, key, build):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry['version'] == self.version and (self.ttl_seconds <= 0 or entry['expires'] > now):
+            return entry
+        version = self.version
+        body = app.json.dumps(build()).encode('utf-8')
+        entry = {
+            'version': version,
+            'expires': now + self.ttl_seconds,
+            'body': body,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+        }
+        with self._lock:
+            if self.version == version:
+                self._entries[key] = entry
+        return entry
+
+members_cache = VersionedResponseCache(RESPONSE_CACHE_TTL_SECONDS)
+placements_cache = VersionedResponseCache(RESPONSE_CACHE_TTL_SECONDS)
+
+def cached_json_response(entry):
+    response = app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    # Clients may keep the body but must revalidate; unchanged lists come back as 304
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+class ActivityLogWriter:
+    """Batches ActivityLog inserts on a background thread.
+
+    Requests only pay for a queue put. The writer flushes when a batch fills or
+    ACTIVITY_LOG_FLUSH_SECONDS pass, and once more at interpreter exit. When the
+    queue is full, callers wait up to ACTIVITY_LOG_ENQUEUE_TIMEOUT before the
+    record is dropped; both cases are counted in stats.
+    """
+
+    def __init__(self, max_queue, batch_size, flush_seconds):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'blocked': 0, 'dropped': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        # Threads don't survive fork, so each worker process starts its own writer
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self.run, name="activity-log-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, record):
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats['blocked'] += 1
+            try:
+                self.queue.put(record, timeout=ACTIVITY_LOG_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                self.stats['dropped'] += 1
+                print(f"Logging error: activity log queue full, dropped {record['action']}")
+                return
+        self.stats['enqueued'] += 1
+
+    def drain(self, batch, limit):
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+            if first is None:
+                return
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            self.write(batch)
+            if stopping:
+                return
+
+    def write(self, batch):
+        for attempt in range(3):
+            try:
+                with app.app_context():
+                    db.session.execute(db.insert(ActivityLog), batch)
+                    db.session.commit()
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                return
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Logging error: {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+        self.stats['dropped'] += len(batch)
+
+    def stop(self):
+        # Called at exit: let the thread write the batch it holds, then write what's left
+        if self._pid == os.getpid() and self._thread.is_alive():
+            try:
+                self.queue.put(None, timeout=ACTIVITY_LOG_ENQUEUE_TIMEOUT)
+                self._thread.join(timeout=10)
+            except queue.Full:
+                pass
+        while True:
+            batch = [r for r in self.drain([], self.batch_size) if r is not None]
+            if not batch:
+                return
+            self.write(batch)
+
+    def snapshot(self):
+        return {**self.stats, 'queued': self.queue.qsize(), 'capacity': self.queue.maxsize}
+
+activity_log_writer = ActivityLogWriter(ACTIVITY_LOG_QUEUE_SIZE, ACTIVITY_LOG_BATCH_SIZE, ACTIVITY_LOG_FLUSH_SECONDS)
+atexit.register(activity_log_writer.stop)
+
+def record_activity(user_id, user_email, action, details=None):
+    activity_log_writer.enqueue({
+        'user_id': user_id,
+        'user_email': user_email,
+        'action': action,
+        'details': details,
+        'timestamp': datetime.utcnow(),
+    })
+
+def archive_activity_logs(retention_days=None, batch_size=5000):
+    # Moves old rows in small transactions so the write lock is never held for long
+    retention_days = ACTIVITY_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    columns = ['id', 'user_id', 'user_email', 'action', 'details', 'timestamp']
+    moved = 0
+    while True:
+        ids = [row.id for row in db.session.query(ActivityLog.id).filter(ActivityLog.timestamp < cutoff).order_by(ActivityLog.id).limit(batch_size)]
+        if not ids:
+            return moved
+        try:
+            db.session.execute(db.insert(ActivityLogArchive).from_select(
+                columns, db.select(*[getattr(ActivityLog, c) for c in columns]).where(ActivityLog.id.in_(ids))
+            ))
+            ActivityLog.query.filter(ActivityLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+
+def activity_log_retention_loop():
+    while True:
+        try:
+            with app.app_context():
+                moved = archive_activity_logs()
+            if moved:
+                print(f"Archived {moved} activity log rows older than {ACTIVITY_LOG_RETENTION_DAYS} days.")
+        except Exception as e:
+            print(f"Activity log retention error: {str(e)}")
+        time.sleep(24 * 3600)
+
+def activity_log_query(model=ActivityLog):
+    """Applies the user/action/from/to filters from the query string; raises ValueError on bad input."""
+    query = model.query
+    user = (request.args.get('user') or '').strip()
+    if user:
+        query = query.filter(model.user_id == int(user)) if user.isdigit() else query.filter(model.user_email == user.lower())
+    action = (request.args.get('action') or '').strip()
+    if action:
+        query = query.filter(model.action == action)
+    for arg, op in (('from', '__ge__'), ('to', '__le__')):
+        value = request.args.get(arg)
+        if value:
+            try:
+                bound = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"{arg} must be an ISO date, e.g. 2026-01-31 or 2026-01-31T18:00:00")
+            if arg == 'to' and len(value) == 10:
+                bound += timedelta(days=1) - timedelta(microseconds=1)
+            query = query.filter(getattr(model.timestamp, op)(bound))
+    return query
+
+def activity_log_keyset(query, model, after):
+    # Newest first; (timestamp, id) keeps the order total when timestamps tie
+    if after is not None:
+        try:
+            ts, row_id = datetime.fromisoformat(after[0]), after[1]
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        query = query.filter(db.or_(model.timestamp < ts, db.and_(model.timestamp == ts, model.id < row_id)))
+    return query.order_by(model.timestamp.desc(), model.id.desc())
+
+def serialize_activity_log(l):
+    return {
+        'id': l.id,
+        'userId': l.user_id,
+        'userEmail': l.user_email,
+        'action': l.action,
+        'details': l.details,
+        'timestamp': l.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
 def log_activity(action, details=None):
     try:
         identity = get_jwt_identity() or {}
         user_id = identity.get('id')
         user_email = identity.get('email')
         if user_id and user_email:
-            log_entry = ActivityLog(
-                user_id=user_id,
-                user_email=user_email,
-                action=action,
-                details=details
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            record_activity(user_id, user_email, action, details)
     except Exception as e:
         print(f"Logging error: {str(e)}")
 
@@ -260,6 +2621,225 @@ def validate_password_strength(password):
         return False, "Password must contain at least one special character (e.g. !, @, #, $, %, etc.)."
     return True, ""
 
+def init_database():
+    """Migrates the schema, seeds defaults and indexes whatever is already on disk."""
+    with app.app_context():
+        migrate_database()
+        seed_database()
+        try:
+            stats = reconcile_catalog()
+            if stats['added'] or stats['updated'] or stats['removed']:
+                print(f"Startup: Media catalog reconciled ({stats['added']} added, {stats['updated']} updated, {stats['removed']} removed).")
+        except Exception as e:
+            print(f"Catalog reconcile error: {str(e)}")
+
+# Background jobs: threads don't survive fork(), so under a preloading server these
+# start after the fork (see gunicorn.conf.py), not at import. Only the process holding
+# an flock on BACKGROUND_JOBS_LOCK runs them, so N workers don't run N reconciles and
+# backfills against one SQLite writer. The lock dies with its holder, and a waiting
+# worker picks the jobs up within BACKGROUND_JOBS_RETRY_SECONDS.
+_background_jobs_started = False
+_background_jobs_lock_file = None
+
+def run_background_jobs():
+    if CATALOG_RECONCILE_SECONDS > 0:
+        threading.Thread(target=catalog_reconcile_loop, daemon=True).start()
+    if ACTIVITY_LOG_RETENTION_DAYS > 0:
+        threading.Thread(target=activity_log_retention_loop, daemon=True).start()
+    if HASH_BACKFILL_ON_START:
+        content_hash_backfill.start()
+    if METADATA_BACKFILL_ON_START:
+        metadata_backfill.start()
+
+def lead_background_jobs():
+    """Blocks until this process holds the jobs lock, then starts the jobs."""
+    global _background_jobs_lock_file
+    if fcntl is not None:
+        os.makedirs(os.path.dirname(BACKGROUND_JOBS_LOCK), exist_ok=True)
+        lock_file = open(BACKGROUND_JOBS_LOCK, 'a')
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                time.sleep(BACKGROUND_JOBS_RETRY_SECONDS)
+        _background_jobs_lock_file = lock_file  # held for the life of the process
+    print(f"Background jobs: running in process {os.getpid()}")
+    run_background_jobs()
+
+def start_background_jobs():
+    global _background_jobs_started
+    if _background_jobs_started or BACKGROUND_JOBS == "off":
+        return
+    _background_jobs_started = True
+    threading.Thread(target=lead_background_jobs, name='background-jobs-leader', daemon=True).start()
+
+# Rate Limiting
+# Floods are turned away in a decorator, before the handler does any bcrypt or database
+# work. Each limit is a token bucket of `burst` tokens refilled at `rate` per second.
+RATE_LIMIT_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+def parse_rate_limit(spec):
+    """'30/minute' -> (0.5 tokens per second, burst of 30)."""
+    try:
+        count, period = spec.split('/')
+        count = int(count)
+        seconds = RATE_LIMIT_PERIODS[period.strip().lower().rstrip('s')]
+    except (ValueError, KeyError):
+        raise RuntimeError(f"Invalid rate limit {spec!r}; expected e.g. '30/minute'")
+    if count <= 0:
+        raise RuntimeError(f"Invalid rate limit {spec!r}; the count must be positive")
+    return count / seconds, count
+
+class MemoryBucketStore:
+    """Token buckets in this process, LRU-bounded to max_keys.
+
+    Evicting a bucket refills it, so the bound trades memory for a little leniency
+    towards keys that have been idle longest.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> [tokens, last refill (monotonic)]
+
+    def take(self, key, rate, burst):
+        """Takes one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+class RedisBucketStore:
+    """Token buckets in Redis, updated atomically by a Lua script."""
+
+    SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()]))
+
+    def __len__(self):
+        return 0  # not tracked; Redis expires idle buckets itself
+
+class RateLimiter:
+    """Named token-bucket limits over a pluggable bucket store.
+
+    `store` only needs take(key, rate, burst) and __len__, so tests or a single-host
+    deployment can swap in any stand-in. A store error lets the request through.
+    """
+
+    def __init__(self, limits, store, enabled=True):
+        self.limits = {name: parse_rate_limit(spec) for name, spec in limits.items() if spec.strip()}
+        self.store = store
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {name: {'allowed': 0, 'limited': 0} for name in self.limits}
+        self.stats['errors'] = 0
+
+    def check(self, name, key):
+        """Returns 0 if the request may proceed, else seconds the client should wait."""
+        if not self.enabled or not key or name not in self.limits:
+            return 0
+        rate, burst = self.limits[name]
+        try:
+            wait = self.store.take(f"{name}:{key}", rate, burst)
+        except Exception as e:
+            print(f"Rate limiter error: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return 0
+        with self._lock:
+            self.stats[name]['limited' if wait else 'allowed'] += 1
+        return wait
+
+    def snapshot(self):
+        with self._lock:
+            stats = {name: dict(v) if isinstance(v, dict) else v for name, v in self.stats.items()}
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'buckets': len(self.store),
+            'limits': {name: {'ratePerSecond': rate, 'burst': burst} for name, (rate, burst) in self.limits.items()},
+            'counters': stats,
+        }
+
+rate_limiter = RateLimiter(
+    RATE_LIMITS,
+    RedisBucketStore(RATE_LIMIT_STORAGE_URL) if RATE_LIMIT_STORAGE_URL else MemoryBucketStore(RATE_LIMIT_MAX_KEYS),
+    enabled=RATE_LIMIT_ENABLED,
+)
+
+_proxy_hops_warned = False
+
+def client_ip():
+    # X-Forwarded-For is client-controlled except for the entries our own proxies appended
+    global _proxy_hops_warned
+    if RATE_LIMIT_PROXY_HOPS is None:
+        if not _proxy_hops_warned and 'X-Forwarded-For' in request.headers:
+            _proxy_hops_warned = True
+            print("Rate limiter warning: X-Forwarded-For received but RATE_LIMIT_PROXY_HOPS is not set; "
+                  "keying on the socket address. Set it to the number of trusted proxies (0 if none).")
+    elif RATE_LIMIT_PROXY_HOPS > 0:
+        forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.remote_addr
+
+def rate_limited(scope, account_field=None):
+    """Applies the '<scope>-ip' limit, plus '<scope>-account' keyed by a JSON body field."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method == 'OPTIONS' or not rate_limiter.enabled:
+                return fn(*args, **kwargs)
+            wait = 0
+            if f"{scope}-ip" in rate_limiter.limits:
+                wait = rate_limiter.check(f"{scope}-ip", client_ip())
+            if not wait and account_field:
+                account = str((request.get_json(silent=True) or {}).get(account_field) or '').strip().lower()
+                wait = rate_limiter.check(f"{scope}-account", account)
+            if wait:
+                retry_after = max(1, int(wait + 0.999))
+                response = jsonify({
+                    'success': False,
+                    'error': 'Too many requests',
+                    'message': f"Too many requests. Try again in {retry_after} second(s).",
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # Route Protection Decorators
 def admin_required(fn):
     @wraps(fn)
@@ -289,6 +2869,7 @@ def photographer_or_admin_required(fn):
 
 # Auth Routes
 @app.route("/register", methods=["POST", "OPTIONS"])
+@rate_limited('auth')
 def register():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
@@ -301,7 +2882,7 @@ def register():
     if not email or not password or not security_question or not security_answer:
         return jsonify({"success": False, "message": "Email, password, security question and answer are required"}), 400
 
-    if User.query.filter_by(email=email).first():
+    if get_cached_user(email=email):
         return jsonify({"success": False, "message": "Email already registered"}), 400
 
     # Validate password complexity
@@ -309,8 +2890,7 @@ def register():
     if not is_strong:
         return jsonify({"success": False, "message": pass_err}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode("utf-8")
-    hashed_answer = bcrypt.generate_password_hash(security_answer.strip().lower()).decode("utf-8")
+    hashed_password, hashed_answer = password_hasher.hash(password, security_answer.strip().lower())
     role = "admin" if email == ADMIN_EMAIL.lower() else "user"
     user = User(
         email=email,
@@ -332,6 +2912,7 @@ def register():
         return jsonify({"success": True, "message": "Registration successful. Please log in."}), 201
 
 @app.route("/login", methods=["POST", "OPTIONS"])
+@rate_limited('auth', account_field='email')
 def login():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
@@ -339,7 +2920,8 @@ def login():
     email = (data.get("email") or "").strip().lower()
     password = data.get("password")
 
-    user = User.query.filter_by(email=email).first()
+    # Credentials and lockout state come from the row, never the identity cache
+    user = User.query.filter_by(email=email).first() if email else None
     if not user:
         return jsonify({"success": False, "message": "Invalid email or password"}), 401
 
@@ -353,7 +2935,7 @@ def login():
         }), 423
 
     # Check password matches
-    if not bcrypt.check_password_hash(user.password, password):
+    if not password_hasher.check(user.password, password):
         user.failed_login_attempts = (user.failed_login_attempts or 0) + 1
         if user.failed_login_attempts >= 5:
             user.lockout_until = datetime.utcnow() + timedelta(minutes=5)
@@ -370,10 +2952,14 @@ def login():
                 "message": f"Invalid email or password. {remaining_attempts} attempt(s) remaining before lockout."
             }), 401
 
-    # Success: reset lockout
-    user.failed_login_attempts = 0
-    user.lockout_until = None
-    db.session.commit()
+    # Success: reset lockout, and upgrade the hash if BCRYPT_LOG_ROUNDS changed since it was made.
+    # A clean login on an up-to-date hash needs no write at all.
+    if user.failed_login_attempts or user.lockout_until or password_hasher.needs_rehash(user.password):
+        user.failed_login_attempts = 0
+        user.lockout_until = None
+        if password_hasher.needs_rehash(user.password):
+            user.password = password_hasher.hash(password)
+        db.session.commit()
 
     token, identity = create_token_for_user(user)
     return (
@@ -382,6 +2968,7 @@ def login():
     )
 
 @app.route("/api/auth/social-login", methods=["POST", "OPTIONS"])
+@rate_limited('auth', account_field='email')
 def social_login():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
@@ -395,8 +2982,7 @@ def social_login():
     user = User.query.filter_by(email=email).first()
     if not user:
         # Create user automatically for social SSO
-        placeholder_pass = bcrypt.generate_password_hash("SocialPass!123").decode("utf-8")
-        placeholder_answer = bcrypt.generate_password_hash("social").decode("utf-8")
+        placeholder_pass, placeholder_answer = password_hasher.hash("SocialPass!123", "social")
         role = "admin" if email == ADMIN_EMAIL.lower() else "user"
         user = User(
             email=email,
@@ -408,16 +2994,14 @@ def social_login():
         )
         db.session.add(user)
         db.session.commit()
-    else:
-        # Ensure role is admin if it matches ADMIN_EMAIL
-        if email == ADMIN_EMAIL.lower() and user.role != "admin":
+    elif (email == ADMIN_EMAIL.lower() and user.role != "admin") or user.failed_login_attempts or user.lockout_until:
+        # Ensure role is admin if it matches ADMIN_EMAIL, and reset lockout
+        if email == ADMIN_EMAIL.lower():
             user.role = "admin"
-            db.session.commit()
-
-    # Success: reset lockout
-    user.failed_login_attempts = 0
-    user.lockout_until = None
-    db.session.commit()
+        user.failed_login_attempts = 0
+        user.lockout_until = None
+        db.session.commit()
+        user_cache.invalidate(user.id)
 
     token, identity = create_token_for_user(user)
     log_activity("social_login", f"User logged in via {provider}")
@@ -428,6 +3012,7 @@ def social_login():
     )
 
 @app.route("/api/auth/forgot-password", methods=["POST", "OPTIONS"])
+@rate_limited('auth', account_field='email')
 def forgot_password():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
@@ -446,6 +3031,7 @@ def forgot_password():
     return jsonify({"success": True, "question": user.security_question}), 200
 
 @app.route("/api/auth/reset-password", methods=["POST", "OPTIONS"])
+@rate_limited('auth', account_field='email')
 def reset_password():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
@@ -465,7 +3051,7 @@ def reset_password():
         return jsonify({"success": False, "message": "No security answer configured for this account."}), 400
 
     # Check answer matches
-    if not bcrypt.check_password_hash(user.security_answer, security_answer):
+    if not password_hasher.check(user.security_answer, security_answer):
         return jsonify({"success": False, "message": "Incorrect answer to security question."}), 400
 
     # Validate password complexity
@@ -474,21 +3060,13 @@ def reset_password():
         return jsonify({"success": False, "message": pass_err}), 400
 
     # Reset password
-    hashed_password = bcrypt.generate_password_hash(new_password).decode("utf-8")
-    user.password = hashed_password
+    user.password = password_hasher.hash(new_password)
     user.failed_login_attempts = 0
     user.lockout_until = None
     db.session.commit()
 
     try:
-        log_entry = ActivityLog(
-            user_id=user.id,
-            user_email=user.email,
-            action="password_reset",
-            details="Password reset via security question answer."
-        )
-        db.session.add(log_entry)
-        db.session.commit()
+        record_activity(user.id, user.email, "password_reset", "Password reset via security question answer.")
     except Exception as e:
         print(f"Logging error during password reset: {e}")
 
@@ -498,7 +3076,7 @@ def reset_password():
 @jwt_required()
 def verify_token():
     identity = get_jwt_identity() or {}
-    user = User.query.get(identity.get('id'))
+    user = get_cached_user(user_id=identity.get('id'))
     if user:
         identity = make_identity(user)
     return jsonify({"valid": True, "user": identity}), 200
@@ -507,15 +3085,93 @@ def verify_token():
 def health():
     return jsonify({"status": "ok"}), 200
 
+@metrics.collector
+def collect_subsystem_metrics():
+    with metrics._lock:
+        in_progress = dict(metrics._values['http_requests_in_progress'])
+    yield ('uploads_in_flight', 'gauge', 'Upload requests currently being received.',
+           [({}, sum(v for (endpoint,), v in in_progress.items() if endpoint in UPLOAD_ENDPOINTS))])
+    try:
+        open_sessions = sum(1 for entry in os.scandir(UPLOAD_SESSIONS_DIR) if entry.is_dir())
+    except OSError:
+        open_sessions = 0
+    yield ('upload_sessions_open', 'gauge', 'Resumable upload sessions not yet completed or expired.', [({}, open_sessions)])
+    yield ('user_cache_lookups_total', 'counter', 'Auth user cache lookups.',
+           [({'result': 'hit'}, user_cache.stats['hits']), ({'result': 'miss'}, user_cache.stats['misses'])])
+    log_stats = activity_log_writer.snapshot()
+    yield ('activity_log_records_total', 'counter', 'Activity log records by outcome.',
+           [({'outcome': key}, log_stats[key]) for key in ('enqueued', 'written', 'dropped', 'blocked', 'errors')])
+    yield ('activity_log_queue_depth', 'gauge', 'Activity log records waiting to be written.', [({}, log_stats['queued'])])
+    limiter = rate_limiter.snapshot()
+    yield ('rate_limit_decisions_total', 'counter', 'Rate limit checks by limit and decision.',
+           [({'limit': name, 'decision': decision}, counts[decision])
+            for name, counts in limiter['counters'].items() if isinstance(counts, dict)
+            for decision in ('allowed', 'limited')])
+    yield ('rate_limit_buckets', 'gauge', 'Token buckets held by the in-process store.', [({}, limiter['buckets'])])
+    for job_name, job in (('content_hash', content_hash_backfill), ('metadata', metadata_backfill)):
+        stats = dict(job.stats)
+        yield (f'{job_name}_backfill_running', 'gauge', f'1 while the {job_name} backfill job runs.', [({}, int(stats['running']))])
+        yield (f'{job_name}_backfill_files', 'gauge', f'Files handled by the current or last {job_name} backfill run.',
+               [({'outcome': key}, stats[key]) for key in ('processed', 'skipped', 'failed')])
+    yield ('folder_tree_cache_lookups_total', 'counter', 'Folder tree cache lookups.',
+           [({'result': 'hit'}, folder_tree_cache.stats['hits']), ({'result': 'miss'}, folder_tree_cache.stats['misses'])])
+    yield ('slow_requests_total', 'counter', 'Requests slower than SLOW_REQUEST_MS.', [({}, request_profiler.stats['slow'])])
+    yield ('request_profiles_written_total', 'counter', 'Request profiles saved to PROFILE_DIR.', [({}, request_profiler.stats['written'])])
+
+def metrics_request_is_local():
+    # A proxied request arrives from the proxy's loopback address, so forwarding headers rule it out
+    if request.headers.get('X-Forwarded-For') or request.headers.get('X-Real-IP'):
+        return False
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        abort(404)
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif not metrics_request_is_local():
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Media/Gallery Routes
 @app.route('/api/images', methods=['GET'])
 def get_folders():
     try:
-        folders = [f for f in os.listdir(BASE_PATH) if os.path.isdir(os.path.join(BASE_PATH, f))]
-        return jsonify({'folders': folders})
+        folders, next_cursor = list_subfolder_page(BASE_PATH)
+        return jsonify({'folders': folders, 'nextCursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to fetch folders: {str(e)}'}), 500
 
+@app.route('/api/tree', methods=['GET'])
+def get_folder_tree():
+    try:
+        folder_path = safe_join_base(*normalize_parts_from_path(request.args.get('path', '')))
+    except ValueError:
+        return jsonify({'error': 'Invalid folder path'}), 400
+    try:
+        depth = int(request.args.get('depth', '1'))
+    except ValueError:
+        return jsonify({'error': 'depth must be an integer'}), 400
+    if not 0 <= depth <= TREE_MAX_DEPTH:
+        return jsonify({'error': f'depth must be between 0 and {TREE_MAX_DEPTH}'}), 400
+    if not fs_isdir(folder_path):
+        return jsonify({'error': 'Folder not found'}), 404
+
+    try:
+        tree = folder_tree_cache.build(folder_path, depth)
+        attach_tree_covers(tree, request.url_root.rstrip('/'))
+        body = app.json.dumps(tree).encode('utf-8')
+        return cached_json_response({'body': body, 'etag': hashlib.sha256(body).hexdigest()[:32]})
+    except Exception as e:
+        return jsonify({'error': f'Failed to build folder tree: {str(e)}'}), 500
+
 @app.route('/api/images/<path:foldername>', methods=['GET'])
 def get_all_images_recursive(foldername):
     try:
@@ -524,38 +3180,48 @@ def get_all_images_recursive(foldername):
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    if not os.path.exists(base_folder_path) or not os.path.isdir(base_folder_path):
+    if not fs_isdir(base_folder_path):
         return jsonify({'error': 'Folder not found'}), 404
 
+    sort_columns = {
+        'name': MediaFile.name, 'mtime': MediaFile.mtime, 'size': MediaFile.size, 'type': MediaFile.kind,
+        # Capture time, falling back to the file's mtime for media without one
+        'taken': db.func.coalesce(MediaFile.taken_at, MediaFile.mtime),
+    }
     try:
-        images = []
-        base_url = request.url_root.rstrip('/')
-        for root, _, files in os.walk(base_folder_path):
-            for file in files:
-                if not allowed_file(file):
-                    continue
-                abs_path = os.path.join(root, file)
-                rel_path = os.path.relpath(abs_path, BASE_PATH)
-                rel_folder = os.path.dirname(rel_path).replace('\\', '/')
-                rel_parts = [secure_filename(p) for p in rel_folder.split('/') if p]
-                encoded_rel_folder = '/'.join(rel_parts)
-                filename = secure_filename(file)
-
-                if encoded_rel_folder:
-                    image_url = f"{base_url}/api/image/{encoded_rel_folder}/{filename}"
-                    download_url = f"{base_url}/api/download/{encoded_rel_folder}/{filename}"
-                else:
-                    image_url = f"{base_url}/api/image/{filename}"
-                    download_url = f"{base_url}/api/download/{filename}"
-
-                images.append({
-                    'id': filename,
-                    'name': filename,
-                    'url': image_url,
-                    'thumbnail': image_url,
-                    'download': download_url,
-                })
-        return jsonify(images), 200
+        sort, descending, limit, after = parse_listing_args({
+            'name': str, 'mtime': CURSOR_NUMBER, 'size': CURSOR_NUMBER, 'type': str, 'taken': CURSOR_NUMBER,
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    kind_filter = request.args.get('kind')
+    if kind_filter not in (None, 'image', 'video'):
+        return jsonify({'error': 'kind must be image or video'}), 400
+
+    try:
+        sort_column = sort_columns[sort]
+        query = db.session.query(*media_row_columns(), sort_column.label('sort_key')).filter(folder_prefix_filter(MediaFile.folder, rel_media_path(base_folder_path)))
+        if kind_filter:
+            query = query.filter(MediaFile.kind == kind_filter)
+        if after is not None:
+            if descending:
+                query = query.filter(db.or_(sort_column < after[0], db.and_(sort_column == after[0], MediaFile.path < after[1])))
+            else:
+                query = query.filter(db.or_(sort_column > after[0], db.and_(sort_column == after[0], MediaFile.path > after[1])))
+        if descending:
+            query = query.order_by(sort_column.desc(), MediaFile.path.desc())
+        else:
+            query = query.order_by(sort_column.asc(), MediaFile.path.asc())
+        rows = query.limit(limit + 1).all() if limit is not None else query.all()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1].sort_key, rows[-1].path])
+
+        images = serialize_media_rows(rows, request.url_root.rstrip('/'))
+        if limit is None:
+            return jsonify(images), 200
+        return jsonify({'images': images, 'nextCursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': f'Failed to fetch images: {str(e)}'}), 500
 
@@ -567,12 +3233,14 @@ def get_subfolders(parent_folder):
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
+    if not fs_isdir(folder_path):
         return jsonify({'error': 'Folder not found'}), 404
 
     try:
-        subfolders = [sf for sf in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, sf))]
-        return jsonify({'subfolders': subfolders})
+        subfolders, next_cursor = list_subfolder_page(folder_path)
+        return jsonify({'subfolders': subfolders, 'nextCursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to fetch subfolders: {str(e)}'}), 500
 
@@ -593,11 +3261,12 @@ def delete_folder(foldername):
     if target_abs == base_abs:
         return jsonify({'error': 'Cannot delete base directory'}), 400
 
-    if not os.path.exists(target_abs) or not os.path.isdir(target_abs):
+    if not fs_isdir(target_abs):
         return jsonify({'error': 'Folder not found'}), 404
 
     try:
         shutil.rmtree(target_abs)
+        catalog_remove_tree(target_abs)
         log_activity("delete_folder", details=foldername)
         return jsonify({'message': 'Folder deleted'}), 200
     except Exception as e:
@@ -605,6 +3274,7 @@ def delete_folder(foldername):
 
 # Public Serve Image
 @app.route('/api/image/<path:foldername>/<filename>', methods=['GET'])
+@rate_limited('media')
 def get_image(foldername, filename):
     try:
         parts = normalize_parts_from_path(foldername)
@@ -613,28 +3283,64 @@ def get_image(foldername, filename):
         return jsonify({'error': 'Invalid folder path'}), 400
 
     file_path = os.path.join(folder_path, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
 
     try:
-        mimetype, _ = guess_type(file_path)
-        return send_file(file_path, mimetype=mimetype or 'application/octet-stream')
+        return send_inline_image(file_path)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch image: {str(e)}'}), 500
 
 @app.route('/api/image/<filename>', methods=['GET'])
+@rate_limited('media')
 def get_image_top(filename):
     file_path = os.path.join(BASE_PATH, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
     try:
-        mimetype, _ = guess_type(file_path)
-        return send_file(file_path, mimetype=mimetype or 'application/octet-stream')
+        return send_inline_image(file_path)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch image: {str(e)}'}), 500
 
+# Public Serve Thumbnail (falls back to the original when no thumbnail can be made)
+@app.route('/api/thumb/<int:size>/<path:filepath>', methods=['GET'])
+@rate_limited('media')
+def get_thumb(size, filepath):
+    if size not in THUMB_SIZES:
+        return jsonify({'error': f'Unsupported thumbnail size. Use one of {list(THUMB_SIZES)}'}), 400
+    try:
+        parts = normalize_parts_from_path(filepath)
+        if not parts:
+            return jsonify({'error': 'Invalid file path'}), 400
+        file_path = safe_join_base(*parts)
+    except ValueError:
+        return jsonify({'error': 'Invalid file path'}), 400
+
+    if not allowed_file(parts[-1]) or not fs_isfile(file_path):
+        return jsonify({'error': 'Image not found'}), 404
+
+    try:
+        st = fs_stat(file_path)
+        version = media_version(st.st_size, st.st_mtime)
+        fmt = negotiate_image_format(file_path)
+        thumb_etag = f"{version}-t{size}-{fmt}" if fmt else f"{version}-t{size}"
+        response = media_not_modified(thumb_etag, version)
+        if response is None:
+            thumb_path = get_thumbnail(file_path, size, fmt)
+            if thumb_path:
+                mimetype = VARIANT_MIMETYPES[fmt] if fmt else 'image/jpeg'
+                response = send_media_file(thumb_path, mimetype=mimetype, etag=thumb_etag, url_version=version)
+            else:
+                response = send_media_file(file_path, st=st)
+        if is_variant_source(file_path):
+            response.vary.add('Accept')
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch thumbnail: {str(e)}'}), 500
+
 # Download Endpoint (Require JWT authentication)
 @app.route('/api/download/<path:foldername>/<filename>', methods=['GET'])
+@rate_limited('media')
 @jwt_required()
 def download_image(foldername, filename):
     try:
@@ -644,26 +3350,136 @@ def download_image(foldername, filename):
         return jsonify({'error': 'Invalid folder path'}), 400
 
     file_path = os.path.join(folder_path, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
 
     try:
-        return send_file(file_path, as_attachment=True, conditional=True)
+        return send_media_file(file_path, as_attachment=True)
     except Exception as e:
         return jsonify({'error': f'Failed to download image: {str(e)}'}), 500
 
 @app.route('/api/download/<filename>', methods=['GET'])
+@rate_limited('media')
 @jwt_required()
 def download_image_top(filename):
     file_path = os.path.join(BASE_PATH, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
     try:
-        return send_file(file_path, as_attachment=True, conditional=True)
+        return send_media_file(file_path, as_attachment=True)
     except Exception as e:
         return jsonify({'error': f'Failed to download image: {str(e)}'}), 500
 
+# Resumable upload sessions
+def get_owned_upload_session(session_id):
+    # Returns (meta, None) or (None, error response)
+    try:
+        meta = load_upload_session(session_id)
+    except ValueError:
+        meta = None
+    if not meta:
+        return None, (jsonify({'error': 'Upload session not found'}), 404)
+    identity = get_jwt_identity() or {}
+    if meta['userId'] != identity.get('id') and not identity.get('is_admin'):
+        return None, (jsonify({'error': 'Upload session belongs to another user'}), 403)
+    return meta, None
+
+@app.route('/api/upload-sessions', methods=['POST', 'OPTIONS'])
+@photographer_or_admin_required
+def create_upload_session_route():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    data = request.get_json(silent=True) or {}
+    foldername = data.get('folderId', '')
+    filename = secure_filename(data.get('filename') or '')
+    try:
+        file_size = int(data.get('fileSize'))
+        chunk_size = int(data.get('chunkSize') or UPLOAD_DEFAULT_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'fileSize and chunkSize must be integers'}), 400
+
+    if not filename or not foldername:
+        return jsonify({'error': 'Missing required fields'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    if file_size < 0 or chunk_size <= 0:
+        return jsonify({'error': 'Invalid fileSize or chunkSize'}), 400
+    total_chunks = max(1, -(-file_size // chunk_size))
+    try:
+        check_upload_geometry(total_chunks, chunk_size, file_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        target_folder = safe_join_base(*normalize_parts_from_path(foldername))
+    except ValueError:
+        return jsonify({'error': 'Invalid folder path'}), 400
+    if not fs_isdir(target_folder):
+        return jsonify({'error': 'Target folder does not exist'}), 404
+
+    try:
+        cleanup_upload_sessions()
+        identity = get_jwt_identity() or {}
+        meta = create_upload_session(uuid.uuid4().hex, identity.get('id'), foldername, filename, total_chunks, chunk_size, file_size)
+        return jsonify(upload_session_status(meta)), 201
+    except Exception as e:
+        return jsonify({'error': f'Failed to create upload session: {str(e)}'}), 500
+
+@app.route('/api/upload-sessions/<session_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+@photographer_or_admin_required
+def manage_upload_session(session_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    meta, error = get_owned_upload_session(session_id)
+    if error:
+        return error
+    if request.method == 'DELETE':
+        shutil.rmtree(upload_session_dir(session_id), ignore_errors=True)
+        with _upload_hashers_lock:
+            _upload_hashers.pop(session_id, None)
+        return jsonify({'message': 'Upload session cancelled'}), 200
+    return jsonify(upload_session_status(meta)), 200
+
+@app.route('/api/upload-sessions/<session_id>/chunks/<int:chunk_index>', methods=['PUT', 'OPTIONS'])
+@photographer_or_admin_required
+def upload_session_chunk(session_id, chunk_index):
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    meta, error = get_owned_upload_session(session_id)
+    if error:
+        return error
+    # Raw bodies are copied straight from the socket; multipart is accepted for convenience
+    file = request.files.get('file')
+    stream = file.stream if file else request.stream
+    try:
+        written = write_upload_chunk(meta, chunk_index, stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to write chunk: {str(e)}'}), 500
+    return jsonify({'chunkIndex': chunk_index, 'bytes': written}), 200
+
+@app.route('/api/upload-sessions/<session_id>/complete', methods=['POST', 'OPTIONS'])
+@photographer_or_admin_required
+def complete_upload_session(session_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    meta, error = get_owned_upload_session(session_id)
+    if error:
+        return error
+    try:
+        final_file_path, sha256 = finish_upload_session(meta)
+    except ValueError as e:
+        return jsonify({'error': str(e), **upload_session_status(meta)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Failed to complete upload: {str(e)}'}), 500
+    ingest_media_file(final_file_path, sha256)
+    prewarm_thumbnails(final_file_path)
+    log_activity("upload", details=f"Folder: {meta['folderId']}, File: {meta['filename']} ({meta['totalChunks']} chunks)")
+    return jsonify({'message': 'File uploaded successfully', 'completed': True}), 201
+
 # Chunked upload route for large video and image files (supports GB-sized files smoothly)
+# Kept for existing clients; runs on the same session machinery with a derived session id.
 @app.route('/api/upload-chunk', methods=['POST', 'OPTIONS'])
 @photographer_or_admin_required
 def upload_chunk():
@@ -672,12 +3488,19 @@ def upload_chunk():
     
     file = request.files.get('file')
     filename = request.form.get('filename')
-    chunk_index = int(request.form.get('chunkIndex', 0))
-    total_chunks = int(request.form.get('totalChunks', 1))
+    try:
+        chunk_index = int(request.form.get('chunkIndex', 0))
+        total_chunks = int(request.form.get('totalChunks', 1))
+    except ValueError:
+        return jsonify({'error': 'chunkIndex and totalChunks must be integers'}), 400
     foldername = request.form.get('folderId', '')
+    chunk_size = request.form.get('chunkSize', type=int)
+    file_size = request.form.get('fileSize', type=int)
 
     if not file or not filename or not foldername:
         return jsonify({'error': 'Missing required fields'}), 400
+    if not 1 <= total_chunks <= UPLOAD_MAX_CHUNKS:
+        return jsonify({'error': f'totalChunks must be between 1 and {UPLOAD_MAX_CHUNKS}'}), 400
 
     filename = secure_filename(filename)
     if not allowed_file(filename):
@@ -685,43 +3508,44 @@ def upload_chunk():
 
     try:
         parts = normalize_parts_from_path(foldername)
-        target_folder = safe_join_base(*parts)
+        safe_join_base(*parts)
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    # Create safe temp chunk directory
-    temp_dir = os.path.join(BASE_PATH, '.temp_chunks', filename)
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # Save current slice
-    chunk_path = os.path.join(temp_dir, f"{filename}.part{chunk_index}")
-    file.save(chunk_path)
+    # Sessions are per uploader, so two photographers sending IMG_0001.JPG never collide
+    identity = get_jwt_identity() or {}
+    session_key = f"{identity.get('id')}:{'/'.join(parts)}:{filename}:{total_chunks}:{file_size}"
+    session_id = hashlib.sha256(session_key.encode()).hexdigest()[:32]
 
-    # Check if all chunks have arrived
-    all_chunks_exist = True
-    for i in range(total_chunks):
-        part_path = os.path.join(temp_dir, f"{filename}.part{i}")
-        if not os.path.exists(part_path):
-            all_chunks_exist = False
-            break
+    try:
+        meta = load_upload_session(session_id)
+        if meta is None:
+            if chunk_size is None:
+                file.stream.seek(0, os.SEEK_END)
+                chunk_len = file.stream.tell()
+                file.stream.seek(0)
+                if chunk_index == total_chunks - 1 and total_chunks > 1:
+                    return jsonify({'error': 'chunkSize is required when the last chunk is sent first'}), 400
+                chunk_size = max(chunk_len, 1)
+            meta = create_upload_session(session_id, identity.get('id'), foldername, filename, total_chunks, chunk_size, file_size)
+        write_upload_chunk(meta, chunk_index, file.stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to store chunk: {str(e)}'}), 500
 
-    if all_chunks_exist:
-        final_file_path = os.path.join(target_folder, filename)
+    if b'\0' not in read_upload_bitmap(meta):
         try:
-            with open(final_file_path, 'wb') as merged_file:
-                for i in range(total_chunks):
-                    part_path = os.path.join(temp_dir, f"{filename}.part{i}")
-                    with open(part_path, 'rb') as part_file:
-                        merged_file.write(part_file.read())
-            
-            # Cleanup temp directory
-            shutil.rmtree(temp_dir)
-            log_activity("upload", details=f"Folder: {foldername}, File: {filename} (Merged {total_chunks} chunks)")
+            final_file_path, sha256 = finish_upload_session(load_upload_session(session_id) or meta)
+        except FileNotFoundError:
+            # A concurrent request for the final chunk already moved the file into place
             return jsonify({'message': 'File uploaded and merged successfully', 'completed': True}), 201
         except Exception as e:
-            if os.path.exists(final_file_path):
-                os.remove(final_file_path)
             return jsonify({'error': f'Failed to merge chunks: {str(e)}'}), 500
+        ingest_media_file(final_file_path, sha256)
+        prewarm_thumbnails(final_file_path)
+        log_activity("upload", details=f"Folder: {foldername}, File: {filename} (Merged {total_chunks} chunks)")
+        return jsonify({'message': 'File uploaded and merged successfully', 'completed': True}), 201
     
     return jsonify({'message': f'Chunk {chunk_index + 1}/{total_chunks} uploaded successfully', 'completed': False}), 200
 
@@ -737,7 +3561,7 @@ def upload_image(foldername):
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    if not os.path.exists(target_folder) or not os.path.isdir(target_folder):
+    if not fs_isdir(target_folder):
         return jsonify({'error': 'Target folder does not exist'}), 404
 
     if 'file' not in request.files:
@@ -756,7 +3580,9 @@ def upload_image(foldername):
                 skipped_files.append(filename)
                 continue
             file_path = os.path.join(target_folder, filename)
-            file.save(file_path)
+            sha256 = save_upload_stream(file.stream, file_path)
+            ingest_media_file(file_path, sha256)
+            prewarm_thumbnails(file_path)
             saved_files.append(filename)
 
         if not saved_files:
@@ -801,11 +3627,12 @@ def delete_image(foldername, filename):
         return jsonify({'error': 'Invalid folder path'}), 400
 
     file_path = os.path.join(folder_path, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
 
     try:
         os.remove(file_path)
+        catalog_remove(file_path)
         log_activity("delete_image", details=f"Folder: {foldername}, File: {filename}")
         return jsonify({'message': 'Deleted'}), 200
     except Exception as e:
@@ -817,10 +3644,11 @@ def delete_image_top(filename):
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
     file_path = os.path.join(BASE_PATH, secure_filename(filename))
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not fs_isfile(file_path):
         return jsonify({'error': 'Image not found'}), 404
     try:
         os.remove(file_path)
+        catalog_remove(file_path)
         log_activity("delete_image", details=f"Folder: [root], File: {filename}")
         return jsonify({'message': 'Deleted'}), 200
     except Exception as e:
@@ -852,14 +3680,15 @@ def rename_file():
     old_path = os.path.join(folder_path, secure_filename(old_name))
     new_path = os.path.join(folder_path, secure_filename(new_name))
 
-    if not os.path.exists(old_path) or not os.path.isfile(old_path):
+    if not fs_isfile(old_path):
         return jsonify({'error': 'Original file not found'}), 404
 
-    if os.path.exists(new_path):
+    if fs_exists(new_path):
         return jsonify({'error': 'A file with the new name already exists'}), 400
 
     try:
         os.rename(old_path, new_path)
+        catalog_move(old_path, new_path)
         log_activity("rename_image", details=f"Folder: {folder_id}, Old: {old_name}, New: {new_name}")
         return jsonify({'message': 'Renamed'}), 200
     except Exception as e:
@@ -885,13 +3714,14 @@ def rename_folder(foldername):
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    if not os.path.exists(old_folder_path) or not os.path.isdir(old_folder_path):
+    if not fs_isdir(old_folder_path):
         return jsonify({'error': 'Folder not found'}), 404
-    if os.path.exists(new_folder_path):
+    if fs_exists(new_folder_path):
         return jsonify({'error': 'Target folder name already exists'}), 400
 
     try:
         os.rename(old_folder_path, new_folder_path)
+        catalog_move_tree(old_folder_path, new_folder_path)
         log_activity("rename_folder", details=f"Old: {foldername}, NewName: {new_name}")
         return jsonify({'message': 'Folder renamed'}), 200
     except Exception as e:
@@ -919,18 +3749,233 @@ def rename_image(foldername, old_name):
     old_path = os.path.join(folder_path, secure_filename(old_name))
     new_path = os.path.join(folder_path, secure_filename(new_name))
 
-    if not os.path.exists(old_path) or not os.path.isfile(old_path):
+    if not fs_isfile(old_path):
         return jsonify({'error': 'Original file not found'}), 404
-    if os.path.exists(new_path):
+    if fs_exists(new_path):
         return jsonify({'error': 'A file with the new name already exists'}), 400
 
     try:
         os.rename(old_path, new_path)
+        catalog_move(old_path, new_path)
         log_activity("rename_image", details=f"Folder: {foldername}, Old: {old_name}, New: {new_name}")
         return jsonify({'message': 'Image renamed'}), 200
     except Exception as e:
         return jsonify({'error': f'Failed to rename image: {str(e)}'}), 500
 
+# Bulk file operations
+# One request carries many delete/rename/move/copy operations for files in one folder.
+# Every path is resolved and checked before anything touches the disk, including clashes
+# between operations in the same batch. The filesystem work then runs in order with a
+# result per item, and the catalog, caches and activity log are updated once at the end.
+BULK_OPERATIONS = ('delete', 'rename', 'move', 'copy')
+
+def plan_bulk_operations(folder_path, operations):
+    """Resolves and validates every operation; returns one plan entry per item (error set when rejected)."""
+    plans = []
+    claimed = set()  # sources already consumed and destinations already taken by this batch
+    for index, op in enumerate(operations):
+        plan = {'index': index, 'op': None, 'name': None, 'error': None}
+        plans.append(plan)
+        if not isinstance(op, dict):
+            plan['error'] = 'Operation must be an object'
+            continue
+        kind, name = op.get('op'), op.get('name')
+        plan.update(op=kind, name=name)
+        if kind not in BULK_OPERATIONS:
+            plan['error'] = f"op must be one of: {', '.join(BULK_OPERATIONS)}"
+            continue
+        if not isinstance(name, str) or not allowed_file(name):
+            plan['error'] = 'Unsupported file extension'
+            continue
+        src = os.path.join(folder_path, secure_filename(name))
+        if not fs_isfile(src):
+            plan['error'] = 'File not found'
+            continue
+        if src in claimed:
+            plan['error'] = 'File is already handled by an earlier operation in this batch'
+            continue
+        plan['src'] = src
+        if kind == 'delete':
+            claimed.add(src)
+            continue
+
+        new_name = op.get('newName') or name
+        target = op.get('target')
+        if kind == 'rename' and not op.get('newName'):
+            plan['error'] = 'newName required'
+            continue
+        if kind in ('move', 'copy') and not isinstance(target, str):
+            plan['error'] = 'target folder required'
+            continue
+        if not isinstance(new_name, str) or not allowed_file(new_name):
+            plan['error'] = 'Unsupported file extension'
+            continue
+        try:
+            dst_folder = folder_path if kind == 'rename' else safe_join_base(*normalize_parts_from_path(target))
+        except ValueError:
+            plan['error'] = 'Invalid target folder path'
+            continue
+        if not fs_isdir(dst_folder):
+            plan['error'] = 'Target folder not found'
+            continue
+        dst = os.path.join(dst_folder, secure_filename(new_name))
+        if dst == src or fs_exists(dst) or dst in claimed:
+            plan['error'] = 'A file with the new name already exists'
+            continue
+        plan['dst'] = dst
+        claimed.add(dst)
+        if kind != 'copy':
+            claimed.add(src)
+    return plans
+
+@app.route('/api/files/bulk', methods=['POST', 'OPTIONS'])
+@photographer_or_admin_required
+def bulk_file_operations():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    data = request.get_json(force=True, silent=True) or {}
+    folder_id = data.get('folderId', '')
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > BULK_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {BULK_MAX_OPERATIONS} operations per request'}), 400
+    try:
+        folder_path = safe_join_base(*normalize_parts_from_path(folder_id or ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid folder path'}), 400
+    if not fs_isdir(folder_path):
+        return jsonify({'error': 'Folder not found'}), 404
+
+    removed, moved, copied = [], [], []
+    results = []
+    counts = {kind: 0 for kind in BULK_OPERATIONS}
+    for plan in plan_bulk_operations(folder_path, operations):
+        result = {'index': plan['index'], 'op': plan['op'], 'name': plan['name']}
+        results.append(result)
+        if plan['error']:
+            result.update(status='error', error=plan['error'])
+            continue
+        src, dst = plan['src'], plan.get('dst')
+        try:
+            if plan['op'] == 'delete':
+                os.remove(src)
+                removed.append(src)
+            elif plan['op'] == 'copy':
+                shutil.copy2(src, dst)
+                copied.append((src, dst))
+            else:
+                os.rename(src, dst)
+                moved.append((src, dst))
+        except Exception as e:
+            result.update(status='error', error=str(e))
+            continue
+        counts[plan['op']] += 1
+        result['status'] = 'ok'
+        if dst:
+            result['path'] = rel_media_path(dst)
+
+    catalog_apply_batch(removed, moved, copied)
+    failed = sum(1 for r in results if r['status'] == 'error')
+    if len(results) > failed:
+        summary = ', '.join(f"{kind.capitalize()}: {count}" for kind, count in counts.items() if count)
+        names = [r['name'] for r in results if r['status'] == 'ok']
+        listed = ', '.join(names[:50]) + (f" (+{len(names) - 50} more)" if len(names) > 50 else '')
+        log_activity("bulk_files", details=f"Folder: {folder_id or '[root]'}, {summary}, Failed: {failed}, Files: {listed}")
+    return jsonify({'results': results, 'succeeded': len(results) - failed, 'failed': failed}), 200
+
+# Streaming ZIP
+# Entries are STORED (photos and videos are already compressed) with CRCs computed while
+# the bytes stream out, so memory stays flat. Sizes are known from stat() up front, which
+# lets us lay out every header in advance, precompute Content-Length and only switch to
+# ZIP64 records for the entries and offsets that actually need them.
+ZIP_CHUNK_SIZE = 1024 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+
+def zip_dos_datetime(mtime):
+    t = datetime.fromtimestamp(mtime)
+    if t.year < 1980:
+        t = datetime(1980, 1, 1)
+    return (t.hour << 11) | (t.minute << 5) | (t.second // 2), ((t.year - 1980) << 9) | (t.month << 5) | t.day
+
+def zip_local_header(name, size, mtime):
+    zip64 = size >= ZIP64_LIMIT
+    extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0) if zip64 else b''
+    dos_time, dos_date = zip_dos_datetime(mtime)
+    size_field = ZIP64_LIMIT if zip64 else 0
+    return struct.pack(
+        '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, 0x0808, 0, dos_time, dos_date,
+        0, size_field, size_field, len(name), len(extra)
+    ) + name + extra
+
+def zip_data_descriptor(crc, size):
+    if size >= ZIP64_LIMIT:
+        return struct.pack('<IIQQ', 0x08074b50, crc, size, size)
+    return struct.pack('<IIII', 0x08074b50, crc, size, size)
+
+def zip_central_header(name, size, mtime, crc, offset):
+    extra_values = []
+    if size >= ZIP64_LIMIT:
+        extra_values += [size, size]
+    if offset >= ZIP64_LIMIT:
+        extra_values.append(offset)
+    extra = struct.pack(f'<HH{len(extra_values)}Q', 0x0001, 8 * len(extra_values), *extra_values) if extra_values else b''
+    dos_time, dos_date = zip_dos_datetime(mtime)
+    size_field = ZIP64_LIMIT if size >= ZIP64_LIMIT else size
+    # Made by Unix (3) so extractors apply the 0644 mode in the external attributes
+    return struct.pack(
+        '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45 if extra_values else 20, 0x0808, 0, dos_time, dos_date,
+        crc, size_field, size_field, len(name), len(extra), 0, 0, 0, 0o100644 << 16,
+        min(offset, ZIP64_LIMIT)
+    ) + name + extra
+
+def zip_end_records(count, cd_offset, cd_size):
+    records = b''
+    if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_eocd_offset = cd_offset + cd_size
+        records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+        records += struct.pack('<IIQI', 0x07064b50, 0, zip64_eocd_offset, 1)
+    return records + struct.pack(
+        '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0
+    )
+
+def plan_zip_stream(files):
+    """Takes [(arcname, abs_path)] and returns (entries, total_length) with offsets resolved."""
+    entries, offset, cd_size = [], 0, 0
+    for arcname, abs_path in files:
+        st = fs_stat(abs_path)
+        name = arcname.encode('utf-8')
+        entry = {'name': name, 'path': abs_path, 'size': st.st_size, 'mtime': st.st_mtime, 'offset': offset}
+        entries.append(entry)
+        offset += len(zip_local_header(name, entry['size'], entry['mtime'])) + entry['size']
+        offset += len(zip_data_descriptor(0, entry['size']))
+        cd_size += len(zip_central_header(name, entry['size'], entry['mtime'], 0, entry['offset']))
+    return entries, offset + cd_size + len(zip_end_records(len(entries), offset, cd_size))
+
+def generate_zip_stream(entries):
+    offset = 0
+    central = []
+    for entry in entries:
+        header = zip_local_header(entry['name'], entry['size'], entry['mtime'])
+        yield header
+        crc, remaining = 0, entry['size']
+        with open(entry['path'], 'rb') as f:
+            while remaining > 0:
+                chunk = f.read(min(ZIP_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{entry['path']} shrank while streaming")
+                crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        descriptor = zip_data_descriptor(crc, entry['size'])
+        yield descriptor
+        central.append(zip_central_header(entry['name'], entry['size'], entry['mtime'], crc, entry['offset']))
+        offset += len(header) + entry['size'] + len(descriptor)
+    cd_size = sum(len(c) for c in central)
+    yield b''.join(central)
+    yield zip_end_records(len(entries), offset, cd_size)
+
 # Download Selected Zip
 @app.route('/api/download-zip', methods=['POST', 'OPTIONS'])
 @jwt_required()
@@ -951,32 +3996,27 @@ def download_zip():
     except ValueError:
         return jsonify({'error': 'Invalid folder path'}), 400
 
-    if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
+    if not fs_isdir(folder_path):
         return jsonify({'error': 'Folder not found'}), 404
 
-    import io
-    import zipfile
-
-    memory_file = io.BytesIO()
     try:
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename in filenames:
-                safe_name = secure_filename(filename)
-                file_path = os.path.join(folder_path, safe_name)
-                if os.path.exists(file_path) and os.path.isfile(file_path):
-                    zip_file.write(file_path, safe_name)
-
-        memory_file.seek(0)
+        files = []
+        seen = set()
+        for filename in filenames:
+            safe_name = secure_filename(filename)
+            file_path = os.path.join(folder_path, safe_name)
+            if safe_name and safe_name not in seen and fs_isfile(file_path):
+                seen.add(safe_name)
+                files.append((safe_name, file_path))
+        entries, total_length = plan_zip_stream(files)
 
         folder_name = parts[-1] if parts else "download"
         download_name = f"{secure_filename(folder_name)}.zip"
 
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=download_name
-        )
+        response = Response(generate_zip_stream(entries), mimetype='application/zip', direct_passthrough=True)
+        response.headers['Content-Length'] = str(total_length)
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        return response
     except Exception as e:
         return jsonify({'error': f'Failed to create zip: {str(e)}'}), 500
 
@@ -1016,6 +4056,7 @@ def admin_update_user_role(user_id):
         old_role = user.role
         user.role = new_role
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         log_activity("change_user_role", details=f"Target: {user.email}, OldRole: {old_role}, NewRole: {new_role}")
         return jsonify({'message': 'User role updated successfully', 'user': {'id': user.id, 'email': user.email, 'role': user.role}}), 200
@@ -1028,30 +4069,209 @@ def admin_get_logs():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
     try:
-        logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).all()
-        log_list = []
-        for l in logs:
-            log_list.append({
-                'id': l.id,
-                'userId': l.user_id,
-                'userEmail': l.user_email,
-                'action': l.action,
-                'details': l.details,
-                'timestamp': l.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            })
-        return jsonify(log_list), 200
+        model = ActivityLogArchive if request.args.get('archive') == 'true' else ActivityLog
+        query = activity_log_query(model)
+        cursor = request.args.get('cursor')
+        if request.args.get('limit') is None and cursor is None:
+            # Legacy shape: a plain array of every matching entry, newest first
+            logs = activity_log_keyset(query, model, None).all()
+            return jsonify([serialize_activity_log(l) for l in logs]), 200
+        limit = max(1, min(request.args.get('limit', LISTING_DEFAULT_LIMIT, type=int), LISTING_MAX_LIMIT))
+        logs = activity_log_keyset(query, model, decode_cursor(cursor, (str, int)) if cursor else None).limit(limit + 1).all()
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor([logs[-1].timestamp.isoformat(), logs[-1].id])
+        return jsonify({'logs': [serialize_activity_log(l) for l in logs], 'nextCursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/logs/export', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_export_logs():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    model = ActivityLogArchive if request.args.get('archive') == 'true' else ActivityLog
+    try:
+        base_query = activity_log_query(model)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fields = ['id', 'userId', 'userEmail', 'action', 'details', 'timestamp']
+
+    def generate():
+        # Keyset batches: each fetch is a short read, so writers are never blocked for the whole export
+        if export_format == 'csv':
+            buf = io.StringIO()
+            csv.writer(buf).writerow(fields)
+            yield buf.getvalue()
+        after = None
+        while True:
+            batch = activity_log_keyset(base_query, model, after).limit(1000).all()
+            if not batch:
+                return
+            rows = [serialize_activity_log(l) for l in batch]
+            if export_format == 'csv':
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for row in rows:
+                    writer.writerow([row[f] for f in fields])
+                yield buf.getvalue()
+            else:
+                yield ''.join(json.dumps(row) + '\n' for row in rows)
+            after = [batch[-1].timestamp.isoformat(), batch[-1].id]
+            db.session.expunge_all()
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="activity_log.{export_format}"'
+    return response
+
+@app.route('/api/admin/logs/archive', methods=['POST', 'OPTIONS'])
+@admin_required
+def admin_archive_logs():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    data = request.get_json(silent=True) or {}
+    try:
+        retention_days = int(data.get('retentionDays', ACTIVITY_LOG_RETENTION_DAYS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'retentionDays must be an integer'}), 400
+    if retention_days <= 0:
+        return jsonify({'error': 'retentionDays must be positive'}), 400
+    try:
+        moved = archive_activity_logs(retention_days)
+        log_activity("archive_logs", details=f"Archived {moved} rows older than {retention_days} days")
+        return jsonify({'message': 'Activity log archived', 'archived': moved}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/logs/writer', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_log_writer_stats():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    return jsonify(activity_log_writer.snapshot()), 200
+
+@app.route('/api/admin/catalog/reconcile', methods=['POST', 'OPTIONS'])
+@admin_required
+def admin_reconcile_catalog():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    data = request.get_json(silent=True) or {}
+    try:
+        parts = normalize_parts_from_path(data.get('folder', ''))
+        folder_path = safe_join_base(*parts)
+    except ValueError:
+        return jsonify({'error': 'Invalid folder path'}), 400
+
+    if not fs_isdir(folder_path):
+        return jsonify({'error': 'Folder not found'}), 404
+
+    try:
+        stats = reconcile_catalog(folder_path)
+        log_activity("reconcile_catalog", details=f"Folder: {data.get('folder') or '[root]'}, Added: {stats['added']}, Updated: {stats['updated']}, Removed: {stats['removed']}")
+        return jsonify({'message': 'Catalog reconciled', **stats}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/duplicates', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_duplicate_report():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    limit = max(1, min(request.args.get('limit', LISTING_DEFAULT_LIMIT, type=int), LISTING_MAX_LIMIT))
+    min_size = max(0, request.args.get('minSize', 0, type=int))
+    try:
+        return jsonify(duplicate_report(limit, min_size)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/hashes/backfill', methods=['GET', 'POST', 'OPTIONS'])
+@admin_required
+def admin_hash_backfill():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    if request.method == 'POST':
+        started = content_hash_backfill.start()
+        if started:
+            log_activity("hash_backfill", details="Started content hash backfill")
+        return jsonify({'started': started, **content_hash_backfill.stats}), 202 if started else 200
+    return jsonify(content_hash_backfill.stats), 200
+
+@app.route('/api/admin/metadata/backfill', methods=['GET', 'POST', 'OPTIONS'])
+@admin_required
+def admin_metadata_backfill():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    if request.method == 'POST':
+        started = metadata_backfill.start()
+        if started:
+            log_activity("metadata_backfill", details="Started media metadata backfill")
+        return jsonify({'started': started, **metadata_backfill.stats}), 202 if started else 200
+    return jsonify(metadata_backfill.stats), 200
+
+@app.route('/api/admin/rate-limits', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_rate_limits():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    return jsonify(rate_limiter.snapshot()), 200
+
+@app.route('/api/admin/slow-requests', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_slow_requests():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    return jsonify({'thresholdMs': SLOW_REQUEST_MS, 'requests': request_profiler.slow_requests()}), 200
+
+@app.route('/api/admin/profiles', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_list_profiles():
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    try:
+        return jsonify({
+            'sampleRate': PROFILE_SAMPLE_RATE,
+            'slowMs': PROFILE_SLOW_MS,
+            'stats': dict(request_profiler.stats),
+            'profiles': request_profiler.list_profiles(),
+        }), 200
+    except Exception as e:
+        print(f"List profiles error: {str(e)}")
+        return jsonify({'error': 'Failed to list profiles'}), 500
+
+@app.route('/api/admin/profiles/<name>', methods=['GET', 'OPTIONS'])
+@admin_required
+def admin_download_profile(name):
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    if not PROFILE_NAME_RE.match(name):
+        return jsonify({'error': 'Invalid profile name'}), 400
+    path = os.path.join(PROFILE_DIR, name)
+    if not fs_isfile(path):
+        return jsonify({'error': 'Profile not found'}), 404
+    mimetype = 'text/plain' if name.endswith('.folded') else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name)
+
 # --- Club Member Routes ---
 
 @app.route('/Members/<path:filename>')
+@rate_limited('media')
 def serve_member_photo(filename):
-    return send_from_directory(os.path.join(BASE_PATH, 'Members'), filename)
+    file_path = safe_join(os.path.join(BASE_PATH, 'Members'), filename)
+    if file_path is None or not fs_isfile(file_path):
+        abort(404)
+    return send_inline_image(file_path)
 
 @app.route('/api/members', methods=['GET'])
 def get_members():
-    try:
+    def build():
         members = ClubMember.query.order_by(ClubMember.display_order.asc()).all()
         result = []
         for m in members:
@@ -1065,7 +4285,10 @@ def get_members():
                 'role_type': m.role_type,
                 'display_order': m.display_order
             })
-        return jsonify(result), 200
+        return result
+
+    try:
+        return cached_json_response(members_cache.get('members', build))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1082,7 +4305,10 @@ def upload_member_avatar():
         filename = f"{int(datetime.utcnow().timestamp())}_{filename}"
         members_dir = os.path.join(BASE_PATH, 'Members')
         os.makedirs(members_dir, exist_ok=True)
-        file.save(os.path.join(members_dir, filename))
+        avatar_path = os.path.join(members_dir, filename)
+        file.save(avatar_path)
+        catalog_upsert(avatar_path)
+        members_cache.bump()
         return jsonify({'photoUrl': f'/Members/{filename}'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1109,6 +4335,7 @@ def add_member():
         )
         db.session.add(member)
         db.session.commit()
+        members_cache.bump()
         log_activity("add_member", details=f"Member: {name}, Role: {member.role_type}")
         return jsonify({'message': 'Member added successfully', 'id': member.id}), 201
     except Exception as e:
@@ -1125,6 +4352,7 @@ def manage_member(member_id):
             name = member.name
             db.session.delete(member)
             db.session.commit()
+            members_cache.bump()
             log_activity("delete_member", details=f"Member: {name}")
             return jsonify({'message': 'Member deleted successfully'}), 200
         except Exception as e:
@@ -1142,6 +4370,7 @@ def manage_member(member_id):
         if 'display_order' in data:
             member.display_order = data['display_order']
         db.session.commit()
+        members_cache.bump()
         log_activity("edit_member", details=f"Member: {member.name}")
         return jsonify({'message': 'Member updated successfully'}), 200
     except Exception as e:
@@ -1162,56 +4391,163 @@ def assign_media():
     if not filepath or not action:
         return jsonify({'error': 'Filepath and action are required'}), 400
 
-    source_path = os.path.abspath(os.path.join(BASE_PATH, filepath))
-    if not os.path.exists(source_path) or not os.path.isfile(source_path):
+    try:
+        source_path = safe_join_base(*normalize_parts_from_path(filepath))
+    except ValueError:
+        return jsonify({'error': 'Invalid file path'}), 400
+    if not fs_isfile(source_path):
         return jsonify({'error': f'Source file not found at {filepath}'}), 404
 
     filename = os.path.basename(source_path)
+    rel = rel_media_path(source_path)
+    category_key = secure_filename(category) if category else ''
 
     try:
-        if action == "set_hero":
-            hero_dir = os.path.join(BASE_PATH, 'Hero')
-            os.makedirs(hero_dir, exist_ok=True)
-            dest_path = os.path.join(hero_dir, filename)
-            shutil.copy2(source_path, dest_path)
-            log_activity("assign_media", details=f"Hero set: {filename}")
-            return jsonify({'message': f'Photo set as Hero background successfully'}), 200
-
-        elif action == "remove_hero":
-            hero_path = os.path.join(BASE_PATH, 'Hero', filename)
-            if os.path.exists(hero_path):
-                os.remove(hero_path)
-                log_activity("assign_media", details=f"Hero removed: {filename}")
-                return jsonify({'message': 'Photo removed from Hero slideshow'}), 200
-            return jsonify({'error': 'File not found in Hero folder'}), 404
-
-        elif action == "set_featured":
-            if not category:
+        if action in ("set_hero", "set_featured"):
+            slot = "hero" if action == "set_hero" else "featured"
+            if slot == "featured" and not category_key:
                 return jsonify({'error': 'Category is required for featured photos'}), 400
-            featured_dir = os.path.join(BASE_PATH, 'Feature', secure_filename(category))
-            os.makedirs(featured_dir, exist_ok=True)
-            dest_path = os.path.join(featured_dir, filename)
-            shutil.copy2(source_path, dest_path)
+            if not is_catalogued(rel):
+                return jsonify({'error': 'Only gallery media can be placed'}), 400
+
+            dest_path = placement_link_path(slot, category_key, rel)
+            linked = (PLACEMENT_MODE == "link" and os.path.dirname(source_path) != placement_dir(slot, category_key)
+                      and link_media_file(source_path, dest_path))
+            if linked:
+                catalog_upsert(dest_path)
+            elif not MediaFile.query.filter_by(path=rel).first():
+                catalog_upsert(source_path)
+            placement = MediaPlacement.query.filter_by(slot=slot, category=category_key, path=rel).first()
+            if placement is None:
+                placement = MediaPlacement(slot=slot, category=category_key, path=rel)
+                db.session.add(placement)
+            if linked:
+                placement.link_path = rel_media_path(dest_path)
+            db.session.commit()
+            placements_cache.bump()
+
+            if slot == "hero":
+                log_activity("assign_media", details=f"Hero set: {filename}")
+                return jsonify({'message': f'Photo set as Hero background successfully'}), 200
             log_activity("assign_media", details=f"Featured set: {filename} in {category}")
             return jsonify({'message': f'Photo featured under {category} successfully'}), 200
 
-        elif action == "remove_featured":
-            if not category:
+        elif action in ("remove_hero", "remove_featured"):
+            slot = "hero" if action == "remove_hero" else "featured"
+            if slot == "featured" and not category_key:
                 return jsonify({'error': 'Category is required to remove featured photo'}), 400
-            featured_path = os.path.join(BASE_PATH, 'Feature', secure_filename(category), filename)
-            if os.path.exists(featured_path):
-                os.remove(featured_path)
-                log_activity("assign_media", details=f"Featured removed: {filename} from {category}")
-                return jsonify({'message': f'Photo removed from Featured: {category}'}), 200
-            return jsonify({'error': f'File not found in category: {category}'}), 404
+
+            placed = db.and_(
+                MediaPlacement.slot == slot, MediaPlacement.category == category_key,
+                db.or_(MediaPlacement.path == rel, MediaPlacement.link_path == rel),
+            )
+            remove_placement_links(placed)
+            removed = MediaPlacement.query.filter(placed).delete(synchronize_session=False)
+            db.session.commit()
+            # Copies placed by older versions sit under the original's basename; another
+            # original with the same name may own that file, so only matching bytes go
+            legacy_path = os.path.join(placement_dir(slot, category_key), filename)
+            if fs_isfile(legacy_path) and (
+                legacy_path == source_path or filecmp.cmp(source_path, legacy_path, shallow=False)
+            ):
+                os.remove(legacy_path)
+                catalog_remove(legacy_path)
+                removed += 1
+            if not removed:
+                if slot == "hero":
+                    return jsonify({'error': 'File not found in Hero folder'}), 404
+                return jsonify({'error': f'File not found in category: {category}'}), 404
+            placements_cache.bump()
+
+            if slot == "hero":
+                log_activity("assign_media", details=f"Hero removed: {filename}")
+                return jsonify({'message': 'Photo removed from Hero slideshow'}), 200
+            log_activity("assign_media", details=f"Featured removed: {filename} from {category}")
+            return jsonify({'message': f'Photo removed from Featured: {category}'}), 200
 
         else:
             return jsonify({'error': f'Invalid action: {action}'}), 400
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Failed to perform media assignment: {str(e)}'}), 500
 
+@app.route('/api/hero', methods=['GET'])
+def get_hero_media():
+    base_url = request.url_root.rstrip('/')
+    try:
+        entry = placements_cache.get(('hero', base_url), lambda: serialize_media_rows(placement_rows('hero'), base_url))
+        return cached_json_response(entry)
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch hero media: {str(e)}'}), 500
+
+@app.route('/api/featured', methods=['GET'])
+def get_featured_categories():
+    try:
+        entry = placements_cache.get(('featured',), lambda: {'categories': featured_categories()})
+        return cached_json_response(entry)
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch featured categories: {str(e)}'}), 500
+
+@app.route('/api/featured/<category>', methods=['GET'])
+def get_featured_media(category):
+    category_key = secure_filename(category)
+    if not category_key:
+        return jsonify({'error': 'Invalid category'}), 400
+    base_url = request.url_root.rstrip('/')
+    try:
+        entry = placements_cache.get(
+            ('featured', category_key, base_url),
+            lambda: serialize_media_rows(placement_rows('featured', category_key), base_url)
+        )
+        return cached_json_response(entry)
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch featured media: {str(e)}'}), 500
+
+# App Factory & CLI
+# The routes are registered on the module-level `app`, so create_app() prepares and returns
+# that instance rather than building a new one. Serving `server:app` directly skips the
+# folders and background jobs; the first request then logs how to switch.
+_app_created = False
+
+def create_app(start_jobs=True):
+    """Returns the configured app without touching the database schema.
+
+    Production servers call this (gunicorn: `server:create_app(start_jobs=False)` with the
+    jobs started post-fork; waitress: `--call server:create_app`). Run `init-db` first.
+    """
+    global _app_created
+    for folder in ('Members', 'Hero', 'Feature'):
+        os.makedirs(os.path.join(BASE_PATH, folder), exist_ok=True)
+    if start_jobs:
+        start_background_jobs()
+    _app_created = True
+    return app
+
+@app.before_request
+def warn_without_factory():
+    global _app_created
+    if not _app_created:
+        _app_created = True
+        print("Startup warning: serving `server:app` without create_app(); background jobs are not running. "
+              "Run `flask --app server init-db` and serve `server:create_app()` instead (see README, Production Serving).")
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Run the periodic background jobs in the foreground (for BACKGROUND_JOBS=off deployments)."""
+    lead_background_jobs()
+    while True:
+        time.sleep(3600)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply schema migrations, seed the admin and members, and index the media tree."""
+    init_database()
+    print("Database initialized.")
+
 if __name__ == '__main__':
+    # Development server; see gunicorn.conf.py for production
+    init_database()
     port = int(os.getenv('PORT', '8087'))
-    debug = os.getenv('FLASK_DEBUG', 'true').lower() in ('1', 'true', 'yes')
-    app.run(debug=debug, host='0.0.0.0', port=port)
+    debug = os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    create_app().run(debug=debug, host='0.0.0.0', port=port)